@@ -4,6 +4,6 @@ Contains all database-related functionality including client, service, and initi
 """
 
 from .client import db_client, VIDEOS_TABLE, PROBLEMS_TABLE
-from .service import DatabaseService
+from .service import DatabaseService, AsyncDatabaseService
 
-__all__ = ['db_client', 'VIDEOS_TABLE', 'PROBLEMS_TABLE', 'DatabaseService']
\ No newline at end of file
+__all__ = ['db_client', 'VIDEOS_TABLE', 'PROBLEMS_TABLE', 'DatabaseService', 'AsyncDatabaseService']
\ No newline at end of file
@@ -1,8 +1,14 @@
 import os
+import logging
+import threading
+import httpx
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
+from postgrest.utils import SyncClient
 from dotenv import load_dotenv
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -23,22 +29,57 @@ if not SUPABASE_URL or not ACTIVE_KEY:
 # Database table names
 VIDEOS_TABLE = "videos"
 PROBLEMS_TABLE = "problems"
+RENDERED_SCRIPTS_TABLE = "rendered_scripts"
+
+# Connection pool shared by every PostgREST call made through the client
+POSTGREST_TIMEOUT = 10.0
+POSTGREST_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
 
-# Create Supabase client
-try:
-    supabase: Client = create_client(SUPABASE_URL, ACTIVE_KEY)
-except Exception as e:
-    print(f"Failed to create Supabase client: {e}")
-    raise
+def _create_supabase_client() -> Client:
+    """Create the Supabase client with a pooled HTTP/2 PostgREST session"""
+    client = create_client(
+        SUPABASE_URL,
+        ACTIVE_KEY,
+        options=ClientOptions(postgrest_client_timeout=POSTGREST_TIMEOUT)
+    )
+    
+    # Swap the default PostgREST session for one with explicit pool limits
+    default_session = client.postgrest.session
+    client.postgrest.session = SyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=POSTGREST_TIMEOUT,
+        limits=POSTGREST_LIMITS,
+        http2=True
+    )
+    default_session.close()
+    return client
 
 class SupabaseClient:
     """Wrapper class for Supabase operations"""
     
     def __init__(self):
-        self.client = supabase
+        self.client: Optional[Client] = None
+        self._lock = threading.Lock()
     
     def get_client(self) -> Client:
+        # Double-checked locking so concurrent callers share a single client
+        if self.client is None:
+            with self._lock:
+                if self.client is None:
+                    try:
+                        self.client = _create_supabase_client()
+                    except Exception:
+                        logger.exception("Failed to create Supabase client")
+                        raise
         return self.client
+    
+    def close(self) -> None:
+        """Close the pooled PostgREST session; the next get_client() reconnects"""
+        with self._lock:
+            if self.client is not None:
+                self.client.postgrest.session.close()
+                self.client = None
 
 # Global instance
 db_client = SupabaseClient()
\ No newline at end of file
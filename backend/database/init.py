@@ -21,9 +21,16 @@ CREATE TABLE IF NOT EXISTS problems (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create index for faster lookups
-CREATE INDEX IF NOT EXISTS idx_problems_title ON problems(title);
-CREATE INDEX IF NOT EXISTS idx_problems_title_slug ON problems(title_slug);
+-- title_slug lookups use the index behind its UNIQUE constraint; a second
+-- B-tree on the same column only slows down writes
+DROP INDEX IF EXISTS idx_problems_title_slug;
+
+-- Trigram index so ILIKE '%title%' searches can use an index scan
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_problems_title_trgm ON problems USING gin (title gin_trgm_ops);
+
+-- The plain B-tree on title cannot serve leading-wildcard matches
+DROP INDEX IF EXISTS idx_problems_title;
 """
     
     # Videos table with Supabase Storage URLs
@@ -31,7 +38,7 @@ CREATE INDEX IF NOT EXISTS idx_problems_title_slug ON problems(title_slug);
 -- Create videos table (stores Supabase Storage URLs only)
 CREATE TABLE IF NOT EXISTS videos (
     id SERIAL PRIMARY KEY,
-    problem_title VARCHAR(255) NOT NULL,
+    problem_title VARCHAR(255) NOT NULL,  -- normalized slug, e.g. "two_sum"
     language VARCHAR(20) NOT NULL CHECK (language IN ('python', 'java', 'cpp')),
     video_type VARCHAR(20) NOT NULL CHECK (video_type IN ('explanation', 'brute_force', 'optimal')),
     storage_url TEXT NOT NULL,  -- Supabase Storage public URL
@@ -41,14 +48,33 @@ CREATE TABLE IF NOT EXISTS videos (
     UNIQUE(problem_title, language, video_type)
 );
 
+-- Drop the legacy base64 blob column if this database predates Storage URLs
+ALTER TABLE videos DROP COLUMN IF EXISTS video_data;
+
+-- Exact (problem_title, language, video_type) lookups use the index behind the
+-- UNIQUE constraint above, so the old duplicate composite index is dropped
+DROP INDEX IF EXISTS idx_videos_lookup;
+
 -- Create indexes for faster video lookups
-CREATE INDEX IF NOT EXISTS idx_videos_lookup ON videos(problem_title, language, video_type);
 CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at);
 CREATE INDEX IF NOT EXISTS idx_videos_storage_url ON videos(storage_url);
+"""
+    
+    # Rendered script hashes, so an identical script reuses an existing upload
+    rendered_scripts_sql = """
+-- Create rendered_scripts table (blake2b hash of a Manim script -> its upload).
+-- Existing databases need this statement run once; until then the backend
+-- logs a single warning and renders every script.
+CREATE TABLE IF NOT EXISTS rendered_scripts (
+    script_hash CHAR(32) PRIMARY KEY,
+    storage_url TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
 """
     
     print(problems_sql)
     print(videos_sql)
+    print(rendered_scripts_sql)
     
     print("\n=== Key Improvements ===")
     print("✅ Videos stored exclusively in Supabase Storage")
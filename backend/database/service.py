@@ -1,9 +1,103 @@
 try:
-    from .client import db_client, VIDEOS_TABLE, PROBLEMS_TABLE
+    from .client import db_client, VIDEOS_TABLE, PROBLEMS_TABLE, RENDERED_SCRIPTS_TABLE
 except ImportError:
-    from client import db_client, VIDEOS_TABLE, PROBLEMS_TABLE
-from typing import Optional, Dict, Any
-from datetime import datetime
+    from client import db_client, VIDEOS_TABLE, PROBLEMS_TABLE, RENDERED_SCRIPTS_TABLE
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timezone
+import asyncio
+import logging
+import threading
+from cachetools import TTLCache
+from postgrest import SyncRequestBuilder
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+logger = logging.getLogger(__name__)
+
+# Single-pass translation used to normalize problem titles into video slugs
+_SLUG_TRANS = str.maketrans({" ": "_", "-": "_"})
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO-8601 string for created_at columns"""
+    return datetime.now(timezone.utc).isoformat()
+
+# Explicit projection so a lingering legacy blob column is never pulled back
+VIDEO_COLUMNS = "id, problem_title, language, video_type, storage_url, created_at"
+
+# Unique keys (declared in init.py) used as upsert conflict targets
+VIDEO_CONFLICT_COLUMNS = "problem_title,language,video_type"
+PROBLEM_CONFLICT_COLUMNS = "title_slug"
+
+# Rows per bulk insert request, kept well under PostgREST payload limits
+BULK_CHUNK_SIZE = 500
+
+def _quote_filter_value(value: str) -> str:
+    """Double-quote a value for a PostgREST logical filter, where , . ( ) are reserved"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _videos() -> SyncRequestBuilder:
+    """Fresh query builder for the videos table straight off the PostgREST client"""
+    return db_client.get_client().postgrest.from_(VIDEOS_TABLE)
+
+def _rendered_scripts() -> SyncRequestBuilder:
+    """Fresh query builder for the rendered_scripts table straight off the PostgREST client"""
+    return db_client.get_client().postgrest.from_(RENDERED_SCRIPTS_TABLE)
+
+# PostgREST/Postgres codes for a table that doesn't exist (or isn't exposed yet)
+_MISSING_TABLE_CODES = frozenset({"42P01", "PGRST205"})
+# Cleared the first time rendered_scripts turns out to be missing, so databases
+# that haven't run the migration in init.py just skip script reuse quietly
+_rendered_scripts_available = True
+
+def _rendered_scripts_missing(error: Exception) -> bool:
+    """Note a missing rendered_scripts table; returns True if that was the error"""
+    global _rendered_scripts_available
+    if isinstance(error, APIError) and error.code in _MISSING_TABLE_CODES:
+        if _rendered_scripts_available:
+            logger.warning("rendered_scripts table not found; skipping script render reuse (see database/init.py)")
+        _rendered_scripts_available = False
+        return True
+    return False
+
+def _problems() -> SyncRequestBuilder:
+    """Fresh query builder for the problems table straight off the PostgREST client"""
+    return db_client.get_client().postgrest.from_(PROBLEMS_TABLE)
+
+# Process-wide cache for read-mostly lookups (problems, existing videos).
+# Writes through DatabaseService invalidate their keys.
+_cache = TTLCache(maxsize=4096, ttl=300)
+# Keys known to have no row, kept only briefly so status polling during a
+# generation doesn't query the database on every request
+_missing = TTLCache(maxsize=4096, ttl=5)
+_cache_lock = threading.RLock()
+
+def _cache_get(key: Tuple) -> Optional[Dict[str, Any]]:
+    with _cache_lock:
+        return _cache.get(key)
+
+def _cache_set(key: Tuple, value: Optional[Dict[str, Any]]) -> None:
+    if value is None:
+        return
+    with _cache_lock:
+        _cache[key] = value
+        _missing.pop(key, None)
+
+def _cache_is_missing(key: Tuple) -> bool:
+    with _cache_lock:
+        return key in _missing
+
+def _cache_set_missing(key: Tuple) -> None:
+    with _cache_lock:
+        _missing[key] = True
+
+def _video_cache_key(problem_title: str, language: str, video_type: str) -> Tuple:
+    # Normalize problem_title to slug for uniqueness
+    return ("video", problem_title.strip().lower().translate(_SLUG_TRANS), language, video_type)
+
+def _cache_pop(key: Tuple) -> None:
+    with _cache_lock:
+        _cache.pop(key, None)
+        _missing.pop(key, None)
 
 class DatabaseService:
     
@@ -11,57 +105,159 @@ class DatabaseService:
     def get_video(problem_title: str, language: str, video_type: str) -> Optional[Dict[str, Any]]:
         """Check if a video already exists for the given parameters"""
         try:
-            # Normalize problem_title to slug for uniqueness
-            title_slug = problem_title.strip().lower().replace(" ", "_").replace("-", "_")
-            response = db_client.get_client().table(VIDEOS_TABLE).select("*").eq(
+            cache_key = _video_cache_key(problem_title, language, video_type)
+            title_slug = cache_key[1]
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                return cached
+            if _cache_is_missing(cache_key):
+                return None
+            
+            response = _videos().select(VIDEO_COLUMNS).eq(
                 "problem_title", title_slug
             ).eq("language", language).eq("video_type", video_type).execute()
             
             if response.data and len(response.data) > 0:
+                _cache_set(cache_key, response.data[0])
                 return response.data[0]
+            _cache_set_missing(cache_key)
             return None
-        except Exception as e:
-            print(f"Error getting video: {e}")
+        except Exception:
+            logger.exception("Error getting video")
             return None
     
     @staticmethod
-    def create_video(problem_title: str, language: str, video_type: str, storage_url: str) -> Optional[Dict[str, Any]]:
-        """Create a new video record in the database with Supabase Storage URL"""
+    def video_exists(problem_title: str, language: str, video_type: str) -> bool:
+        """Check whether a video record exists without fetching the row"""
         try:
+            cache_key = _video_cache_key(problem_title, language, video_type)
+            title_slug = cache_key[1]
+            if _cache_get(cache_key) is not None:
+                return True
+            if _cache_is_missing(cache_key):
+                return False
+
+            # Served by the UNIQUE (problem_title, language, video_type) index
+            response = _videos().select("id").eq(
+                "problem_title", title_slug
+            ).eq("language", language).eq("video_type", video_type).limit(1).execute()
+
+            return bool(response.data)
+        except Exception:
+            logger.exception("Error checking video existence")
+            return False
+
+    @staticmethod
+    def get_videos_bulk(problem_title: str, languages: List[str], video_types: List[str]) -> Optional[Dict[Tuple[str, str], Dict[str, Any]]]:
+        """Fetch all videos for a problem across languages/video types in a single query"""
+        try:
+            if not languages or not video_types:
+                return {}
             # Normalize problem_title to slug for uniqueness
-            title_slug = problem_title.strip().lower().replace(" ", "_").replace("-", "_")
-            video_record = {
-                "problem_title": title_slug,
-                "language": language,
-                "video_type": video_type,
-                "storage_url": storage_url,  # Store Supabase Storage URL
-                "created_at": datetime.utcnow().isoformat()
-            }
+            title_slug = problem_title.strip().lower().translate(_SLUG_TRANS)
+            response = _videos().select(VIDEO_COLUMNS).eq(
+                "problem_title", title_slug
+            ).in_("language", languages).in_("video_type", video_types).execute()
+
+            return {(row["language"], row["video_type"]): row for row in response.data or []}
+        except Exception:
+            logger.exception("Error getting videos in bulk")
+            return None
+
+    @staticmethod
+    def _video_record(problem_title: str, language: str, video_type: str, storage_url: str) -> Dict[str, Any]:
+        """Build a videos row, normalizing problem_title to slug for uniqueness"""
+        return {
+            "problem_title": problem_title.strip().lower().translate(_SLUG_TRANS),
+            "language": language,
+            "video_type": video_type,
+            "storage_url": storage_url,  # Store Supabase Storage URL
+            "created_at": _now_iso()
+        }
+    
+    @staticmethod
+    def create_video(problem_title: str, language: str, video_type: str, storage_url: str) -> bool:
+        """Create or replace a video record with Supabase Storage URL without reading the row back"""
+        try:
+            video_record = DatabaseService._video_record(problem_title, language, video_type, storage_url)
+            
+            # Upsert on the UNIQUE(problem_title, language, video_type) constraint so
+            # concurrent writers for the same video cannot collide
+            _videos().upsert(
+                video_record, on_conflict=VIDEO_CONFLICT_COLUMNS, returning=ReturnMethod.minimal
+            ).execute()
+            _cache_pop(("video", video_record["problem_title"], language, video_type))
+            return True
+        except Exception:
+            logger.exception("Error creating video")
+            return False
+    
+    @staticmethod
+    def create_video_returning(problem_title: str, language: str, video_type: str, storage_url: str) -> Optional[Dict[str, Any]]:
+        """Create or replace a video record and return the stored row"""
+        try:
+            video_record = DatabaseService._video_record(problem_title, language, video_type, storage_url)
             
-            response = db_client.get_client().table(VIDEOS_TABLE).insert(video_record).execute()
+            response = _videos().upsert(video_record, on_conflict=VIDEO_CONFLICT_COLUMNS).execute()
+            _cache_pop(("video", video_record["problem_title"], language, video_type))
             
             if response.data and len(response.data) > 0:
                 return response.data[0]
             return None
-        except Exception as e:
-            print(f"Error creating video: {e}")
+        except Exception:
+            logger.exception("Error creating video")
             return None
     
     @staticmethod
     def delete_video(problem_title: str, language: str, video_type: str) -> bool:
         """Delete a video record from the database"""
         try:
-            response = db_client.get_client().table(VIDEOS_TABLE).delete().eq(
-                "problem_title", problem_title
+            # Normalize problem_title to slug, matching get_video/create_video
+            title_slug = problem_title.strip().lower().translate(_SLUG_TRANS)
+            response = _videos().delete().eq(
+                "problem_title", title_slug
             ).eq(
                 "language", language
             ).eq(
                 "video_type", video_type
             ).execute()
+            _cache_pop(("video", title_slug, language, video_type))
             
             return response.data is not None
+        except Exception:
+            logger.exception("Error deleting video")
+            return False
+    
+    @staticmethod
+    def get_rendered_script_url(script_hash: str) -> Optional[str]:
+        """Storage URL of a video previously rendered from the script with this hash"""
+        if not _rendered_scripts_available:
+            return None
+        try:
+            response = _rendered_scripts().select("storage_url").eq(
+                "script_hash", script_hash
+            ).limit(1).execute()
+            
+            return response.data[0]["storage_url"] if response.data else None
         except Exception as e:
-            print(f"Error deleting video: {e}")
+            if not _rendered_scripts_missing(e):
+                logger.exception("Error getting rendered script")
+            return None
+    
+    @staticmethod
+    def record_rendered_script(script_hash: str, storage_url: str) -> bool:
+        """Remember which uploaded video a script rendered to"""
+        if not _rendered_scripts_available:
+            return False
+        try:
+            _rendered_scripts().upsert(
+                {"script_hash": script_hash, "storage_url": storage_url, "created_at": _now_iso()},
+                on_conflict="script_hash", returning=ReturnMethod.minimal
+            ).execute()
+            return True
+        except Exception as e:
+            if not _rendered_scripts_missing(e):
+                logger.exception("Error recording rendered script")
             return False
     
 
@@ -70,75 +266,266 @@ class DatabaseService:
     def get_problem_by_title_slug(title_slug: str) -> Optional[Dict[str, Any]]:
         """Get a problem by title slug"""
         try:
-            response = db_client.get_client().table(PROBLEMS_TABLE).select("*").eq(
+            cache_key = ("problem_slug", title_slug)
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                return cached
+            
+            response = _problems().select("*").eq(
                 "title_slug", title_slug
             ).execute()
             
             if response.data and len(response.data) > 0:
+                _cache_set(cache_key, response.data[0])
                 return response.data[0]
             return None
-        except Exception as e:
-            print(f"Error getting problem by title slug: {e}")
+        except Exception:
+            logger.exception("Error getting problem by title slug")
             return None
-    
+
+    @staticmethod
+    def get_problem_by_title_or_slug(title: str, title_slug: str) -> Optional[Dict[str, Any]]:
+        """Get a problem whose title slug or exact title matches, in a single query"""
+        try:
+            cached = _cache_get(("problem_slug", title_slug))
+            if cached is not None:
+                return cached
+            
+            query = _problems().select("*").limit(2)
+            # postgrest-py 0.10 has no or_(), so add PostgREST's or= filter directly
+            query.params = query.params.add(
+                "or", f"(title_slug.eq.{_quote_filter_value(title_slug)},title.eq.{_quote_filter_value(title)})"
+            )
+            rows = query.execute().data or []
+            if not rows:
+                return None
+            # Prefer the slug match if both rows came back
+            problem = next((row for row in rows if row["title_slug"] == title_slug), rows[0])
+            _cache_set(("problem_slug", problem["title_slug"]), problem)
+            return problem
+        except Exception:
+            logger.exception("Error getting problem by title or slug")
+            return None
+
+    @staticmethod
+    def get_problems_by_slugs(slugs: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Get several problems by title slug in a single query, keyed by title_slug"""
+        try:
+            if not slugs:
+                return {}
+            response = _problems().select("*").in_(
+                "title_slug", slugs
+            ).execute()
+
+            return {row["title_slug"]: row for row in response.data or []}
+        except Exception:
+            logger.exception("Error getting problems by slugs")
+            return None
+
     @staticmethod
-    def get_problem_by_title(title: str) -> Optional[Dict[str, Any]]:
-        """Get a problem by title"""
+    def get_problem_by_title(title: str, title_slug: str) -> Optional[Dict[str, Any]]:
+        """Get a problem by title, given the LeetCode slug the caller derived from it"""
         try:
-            response = db_client.get_client().table(PROBLEMS_TABLE).select("*").ilike(
+            cache_key = ("problem_title", title)
+            cached = _cache_get(cache_key)
+            if cached is not None:
+                return cached
+            
+            # Exact slug/title lookup hits the unique index; only fall back to
+            # the (trigram-indexed) substring match when that misses
+            problem = DatabaseService.get_problem_by_title_or_slug(
+                title.strip(), title_slug
+            )
+            if problem:
+                _cache_set(cache_key, problem)
+                return problem
+            
+            response = _problems().select("*").ilike(
                 "title", f"%{title}%"
             ).execute()
             
             if response.data and len(response.data) > 0:
+                _cache_set(cache_key, response.data[0])
                 return response.data[0]
             return None
-        except Exception as e:
-            print(f"Error getting problem by title: {e}")
+        except Exception:
+            logger.exception("Error getting problem by title")
             return None
     
     @staticmethod
-    def create_problem_from_leetcode(leetcode_data: Dict[str, Any], title_slug: str) -> Optional[Dict[str, Any]]:
-        """Create a new problem record from LeetCode API data - only essential fields"""
+    def _problem_record(leetcode_data: Dict[str, Any], title_slug: str) -> Dict[str, Any]:
+        """Build a problems row from LeetCode API data - only essential fields"""
+        return {
+            "title": leetcode_data.get("title", ""),
+            "title_slug": title_slug,
+            "content": leetcode_data.get("content", ""),
+            "difficulty": leetcode_data.get("difficulty", "")
+        }
+    
+    @staticmethod
+    def create_problem_from_leetcode(leetcode_data: Dict[str, Any], title_slug: str) -> bool:
+        """Create or update a problem record from LeetCode API data without reading the row back"""
         try:
-            problem_data = {
-                "title": leetcode_data.get("title", ""),
-                "title_slug": title_slug,
-                "content": leetcode_data.get("content", ""),
-                "difficulty": leetcode_data.get("difficulty", "")
-            }
+            problem_data = DatabaseService._problem_record(leetcode_data, title_slug)
             
-            response = db_client.get_client().table(PROBLEMS_TABLE).insert(problem_data).execute()
+            _problems().upsert(
+                problem_data, on_conflict=PROBLEM_CONFLICT_COLUMNS, returning=ReturnMethod.minimal
+            ).execute()
+            _cache_pop(("problem_slug", title_slug))
+            return True
+        except Exception:
+            logger.exception("Error creating problem from LeetCode data")
+            return False
+    
+    @staticmethod
+    def create_problem_from_leetcode_returning(leetcode_data: Dict[str, Any], title_slug: str) -> Optional[Dict[str, Any]]:
+        """Create or update a problem record from LeetCode API data and return the stored row"""
+        try:
+            problem_data = DatabaseService._problem_record(leetcode_data, title_slug)
+            
+            response = _problems().upsert(problem_data, on_conflict=PROBLEM_CONFLICT_COLUMNS).execute()
+            _cache_pop(("problem_slug", title_slug))
             
             if response.data and len(response.data) > 0:
                 return response.data[0]
             return None
-        except Exception as e:
-            print(f"Error creating problem from LeetCode data: {e}")
+        except Exception:
+            logger.exception("Error creating problem from LeetCode data")
             return None
     
+    @staticmethod
+    def create_problems_bulk(rows: List[Dict[str, Any]]) -> Optional[int]:
+        """Upsert many problem rows (title, title_slug, content, difficulty) in batched requests"""
+        try:
+            written = 0
+            for start in range(0, len(rows), BULK_CHUNK_SIZE):
+                chunk = rows[start:start + BULK_CHUNK_SIZE]
+                _problems().upsert(
+                    chunk, on_conflict=PROBLEM_CONFLICT_COLUMNS, returning=ReturnMethod.minimal
+                ).execute()
+                written += len(chunk)
+                for row in chunk:
+                    _cache_pop(("problem_slug", row["title_slug"]))
+            return written
+        except Exception:
+            logger.exception("Error bulk creating problems")
+            return None
+
+    @staticmethod
+    def create_videos_bulk(rows: List[Dict[str, Any]]) -> Optional[int]:
+        """Upsert many video rows (problem_title, language, video_type, storage_url) in batched requests"""
+        try:
+            records = [
+                DatabaseService._video_record(
+                    row["problem_title"], row["language"], row["video_type"], row["storage_url"]
+                )
+                for row in rows
+            ]
+
+            written = 0
+            for start in range(0, len(records), BULK_CHUNK_SIZE):
+                chunk = records[start:start + BULK_CHUNK_SIZE]
+                _videos().upsert(
+                    chunk, on_conflict=VIDEO_CONFLICT_COLUMNS, returning=ReturnMethod.minimal
+                ).execute()
+                written += len(chunk)
+                for record in chunk:
+                    _cache_pop(("video", record["problem_title"], record["language"], record["video_type"]))
+            return written
+        except Exception:
+            logger.exception("Error bulk creating videos")
+            return None
+
     @staticmethod
     def get_all_videos() -> Optional[list]:
         """Get all video records from the database"""
         try:
-            response = db_client.get_client().table(VIDEOS_TABLE).select("*").order("created_at", desc=True).execute()
+            response = _videos().select(VIDEO_COLUMNS).order("created_at", desc=True).execute()
             
             if response.data:
                 return response.data
             return []
-        except Exception as e:
-            print(f"Error getting all videos: {e}")
+        except Exception:
+            logger.exception("Error getting all videos")
             return None
     
     @staticmethod
     def clear_all_videos() -> bool:
         """Clear all video records from the database (for testing)"""
         try:
-            response = db_client.get_client().table(VIDEOS_TABLE).delete().neq("id", 0).execute()
+            _videos().delete().neq("id", 0).execute()
+            DatabaseService.clear_caches()
             return True
-        except Exception as e:
-            print(f"Error clearing all videos: {e}")
+        except Exception:
+            logger.exception("Error clearing all videos")
             return False
 
+    @staticmethod
+    def clear_caches() -> None:
+        """Drop every cached lookup (used after bulk deletes and in tests)"""
+        with _cache_lock:
+            _cache.clear()
+            _missing.clear()
+
+class AsyncDatabaseService:
+    """
+    Awaitable counterparts of DatabaseService for use in async handlers.
+    Each call runs the synchronous query in a worker thread, so independent
+    lookups can be fanned out with asyncio.gather without blocking the event loop.
+    Lookups already in the process cache are answered without the thread hop.
+    """
+    
+    @staticmethod
+    async def get_video(problem_title: str, language: str, video_type: str) -> Optional[Dict[str, Any]]:
+        cache_key = _video_cache_key(problem_title, language, video_type)
+        cached = _cache_get(cache_key)
+        if cached is not None or _cache_is_missing(cache_key):
+            return cached
+        return await asyncio.to_thread(DatabaseService.get_video, problem_title, language, video_type)
+    
+    @staticmethod
+    async def video_exists(problem_title: str, language: str, video_type: str) -> bool:
+        return await asyncio.to_thread(DatabaseService.video_exists, problem_title, language, video_type)
+    
+    @staticmethod
+    async def get_videos_bulk(problem_title: str, languages: List[str], video_types: List[str]) -> Optional[Dict[Tuple[str, str], Dict[str, Any]]]:
+        return await asyncio.to_thread(DatabaseService.get_videos_bulk, problem_title, languages, video_types)
+    
+    @staticmethod
+    async def create_video(problem_title: str, language: str, video_type: str, storage_url: str) -> bool:
+        return await asyncio.to_thread(DatabaseService.create_video, problem_title, language, video_type, storage_url)
+    
+    @staticmethod
+    async def delete_video(problem_title: str, language: str, video_type: str) -> bool:
+        return await asyncio.to_thread(DatabaseService.delete_video, problem_title, language, video_type)
+    
+    @staticmethod
+    async def get_problem_by_title_slug(title_slug: str) -> Optional[Dict[str, Any]]:
+        cached = _cache_get(("problem_slug", title_slug))
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(DatabaseService.get_problem_by_title_slug, title_slug)
+    
+    @staticmethod
+    async def get_problems_by_slugs(slugs: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        return await asyncio.to_thread(DatabaseService.get_problems_by_slugs, slugs)
+    
+    @staticmethod
+    async def get_problem_by_title(title: str, title_slug: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(DatabaseService.get_problem_by_title, title, title_slug)
+    
+    @staticmethod
+    async def create_problem_from_leetcode(leetcode_data: Dict[str, Any], title_slug: str) -> bool:
+        return await asyncio.to_thread(DatabaseService.create_problem_from_leetcode, leetcode_data, title_slug)
+    
+    @staticmethod
+    async def get_all_videos() -> Optional[list]:
+        return await asyncio.to_thread(DatabaseService.get_all_videos)
+    
+    @staticmethod
+    async def clear_all_videos() -> bool:
+        return await asyncio.to_thread(DatabaseService.clear_all_videos)
+
 if __name__ == "__main__":
     print("Database Service initialized successfully!")
     print(f"Videos table: {VIDEOS_TABLE}")
@@ -4,17 +4,65 @@ This replaces the base64 video storage in the database with proper file storage.
 """
 
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Callable
 from supabase import Client
 try:
-    from .client import db_client
+    from .client import db_client, SUPABASE_URL
 except ImportError:
-    from client import db_client
-import uuid
-from datetime import datetime
+    from client import db_client, SUPABASE_URL
+import logging
+import secrets
+import threading
+import time
+from cachetools import LRUCache
 import boto3
+import botocore.config
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
+logger = logging.getLogger(__name__)
+
+# Spaces and hyphens in problem titles become underscores in object keys
+_SAFE_TITLE_TRANS = str.maketrans({" ": "_", "-": "_"})
+
+# Fraction of a signed URL's lifetime during which it is reused. Every URL
+# handed out therefore still has at least the remaining fraction left, which
+# callers can rely on when letting clients cache it.
+SIGNED_URL_REUSE_FRACTION = 0.5
+
+# One boto3 session and client config shared by every S3 client, so credential
+# and endpoint metadata loading happens once per process
+_SESSION = boto3.session.Session()
+_S3_CONFIG = botocore.config.Config(
+    s3={'addressing_style': 'path'},  # Force path style for Supabase
+    max_pool_connections=64,  # Room for concurrent multipart parts and requests
+    retries={'mode': 'standard', 'max_attempts': 5},
+    tcp_keepalive=True  # SO_KEEPALIVE so idle pooled connections survive NAT/edge reaping
+)
+
+class _UploadProgress:
+    """
+    boto3 transfer callback that turns per-part byte counts (reported from
+    several worker threads) into an overall fraction for progress_callback.
+    """
+    
+    def __init__(self, total_bytes: int, progress_callback: Callable[[float], None]):
+        self._total = max(total_bytes, 1)
+        self._sent = 0
+        self._last_percent = -1
+        self._callback = progress_callback
+        self._lock = threading.Lock()
+    
+    def __call__(self, bytes_transferred: int) -> None:
+        with self._lock:
+            self._sent += bytes_transferred
+            percent = min(self._sent * 100 // self._total, 100)
+            if percent == self._last_percent:
+                return
+            self._last_percent = percent
+            # Report under the lock so progress never appears to go backwards
+            self._callback(percent / 100)
+
 class SupabaseStorageService:
     """Service for managing video files in Supabase Storage using S3 SDK"""
     
@@ -22,7 +70,21 @@ class SupabaseStorageService:
     
     def __init__(self):
         self.client: Client = db_client.get_client()
+        # Resolve URL-derived values once rather than on every upload
+        self._supabase_url = SUPABASE_URL
+        self._project_ref = SUPABASE_URL.split("//", 1)[1].split(".", 1)[0]
+        self._public_prefix = f"{SUPABASE_URL}/storage/v1/object/public/{self.BUCKET_NAME}/"
         self.s3_client = self._create_s3_client()
+        # Upload large videos as 16 MiB parts, several in flight at once
+        self.transfer_config = TransferConfig(
+            multipart_threshold=16 * 1024 * 1024,
+            multipart_chunksize=16 * 1024 * 1024,
+            max_concurrency=8,
+            use_threads=True
+        )
+        # Signed URLs: (filename, expires_in) -> (url, monotonic time to stop reusing it)
+        self._signed_urls = LRUCache(maxsize=10000)
+        self._signed_urls_lock = threading.Lock()
         self._ensure_bucket_exists()
     
     def _create_s3_client(self):
@@ -36,33 +98,26 @@ class SupabaseStorageService:
             
             # Fallback to auto-detection if specific S3 vars not set
             if not all([access_key_id, secret_access_key, endpoint_url]):
-                supabase_url = os.getenv("SUPABASE_URL")
-                if not supabase_url:
-                    raise ValueError("SUPABASE_URL not found")
-                
-                # Extract project ref from URL
-                project_ref = supabase_url.split("//")[1].split(".")[0]
-                access_key_id = project_ref
+                access_key_id = self._project_ref
                 secret_access_key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
-                endpoint_url = f"https://{project_ref}.supabase.co/storage/v1/s3"
+                endpoint_url = f"https://{self._project_ref}.supabase.co/storage/v1/s3"
             
             if not secret_access_key:
                 raise ValueError("No service key found for S3 authentication")
             
-            s3_client = boto3.client(
+            s3_client = _SESSION.client(
                 's3',
                 endpoint_url=endpoint_url,
                 aws_access_key_id=access_key_id,
                 aws_secret_access_key=secret_access_key,
                 region_name=region,
-                config=boto3.session.Config(
-                    s3={'addressing_style': 'path'}  # Force path style for Supabase
-                )
+                config=_S3_CONFIG
             )
             
             return s3_client
             
         except Exception as e:
+            logger.warning("S3 client unavailable, using the Supabase client: %s", e)
             return None
     
     def _ensure_bucket_exists(self):
@@ -72,7 +127,8 @@ class SupabaseStorageService:
         # This avoids authentication issues with bucket listing operations
         pass
     
-    def upload_video(self, video_path: str, problem_title: str, language: str, video_type: str) -> Optional[str]:
+    def upload_video(self, video_path: str, problem_title: str, language: str, video_type: str,
+                     progress_callback: Optional[Callable[[float], None]] = None) -> Optional[str]:
         """
         Upload video file to Supabase Storage using S3 SDK.
         
@@ -81,75 +137,122 @@ class SupabaseStorageService:
             problem_title: Title of the LeetCode problem
             language: Programming language (python, java, cpp)
             video_type: Type of video (explanation, brute_force, optimal)
+            progress_callback: Optional callable receiving the uploaded fraction
+                (0.0-1.0) as multipart parts complete (S3 path only)
             
         Returns:
             Public URL of the uploaded video or None if upload failed
         """
         try:
             # Generate unique filename
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            safe_title = problem_title.lower().replace(" ", "_").replace("-", "_")
-            filename = f"{safe_title}_{language}_{video_type}_{timestamp}.mp4"
-            
-            # Uploading video to storage
+            filename = self._new_key(self._key_prefix(problem_title, language, video_type))
             
             # Try S3 upload first if S3 client is available
             if self.s3_client:
                 try:
-                    # Upload using S3 SDK
-                    with open(video_path, 'rb') as video_file:
-                        self.s3_client.upload_fileobj(
-                            video_file,
-                            self.BUCKET_NAME,
-                            filename,
-                            ExtraArgs={
-                                'ContentType': 'video/mp4',
-                                'CacheControl': 'max-age=3600'
-                            }
-                        )
-                    
-                    # Generate public URL
-                    supabase_url = os.getenv("SUPABASE_URL")
-                    project_ref = supabase_url.split("//")[1].split(".")[0]
-                    public_url = f"{supabase_url}/storage/v1/object/public/{self.BUCKET_NAME}/{filename}"
+                    # Upload by path so each multipart part is read from disk at
+                    # its own offset rather than buffered from a shared file object
+                    self.s3_client.upload_file(
+                        video_path,
+                        self.BUCKET_NAME,
+                        filename,
+                        ExtraArgs={
+                            'ContentType': 'video/mp4',
+                            'CacheControl': 'max-age=3600'
+                        },
+                        Config=self.transfer_config,
+                        Callback=_UploadProgress(os.path.getsize(video_path), progress_callback)
+                        if progress_callback else None
+                    )
                     
                     # Video uploaded successfully
-                    return public_url
+                    return self._public_prefix + filename
                     
                 except ClientError as e:
                     # S3 upload failed, falling back to Supabase client
-                    pass
+                    logger.warning("S3 upload failed, falling back to the Supabase client: %s", e)
                 except Exception as e:
                     # S3 upload error, falling back to Supabase client
-                    pass
+                    logger.warning("S3 upload error, falling back to the Supabase client: %s", e)
             
-            # Fallback to Supabase client
+            # Fallback to Supabase client - pass the open file so httpx streams it
+            # from disk instead of buffering the whole video in memory.
+            # storage3 raises StorageException on a non-2xx response.
             with open(video_path, 'rb') as video_file:
-                video_data = video_file.read()
+                self.client.storage.from_(self.BUCKET_NAME).upload(
+                    filename,
+                    video_file,
+                    file_options={
+                        "content-type": "video/mp4",
+                        "cache-control": "3600",
+                        "x-upsert": "false"
+                    }
+                )
             
-            response = self.client.storage.from_(self.BUCKET_NAME).upload(
-                filename,
-                video_data,
-                file_options={
-                    "content-type": "video/mp4",
-                    "cache-control": "3600",
-                    "upsert": False
-                }
-            )
+            # Video uploaded successfully via Supabase client
+            return self.client.storage.from_(self.BUCKET_NAME).get_public_url(filename)
             
-            if response and not response.get('error'):
-                public_url = self.client.storage.from_(self.BUCKET_NAME).get_public_url(filename)
-                # Video uploaded successfully via Supabase client
-                return public_url
-            else:
-                error_msg = response.get('error', 'Unknown error') if response else 'No response'
-                # Supabase client upload failed
-                return None
+        except Exception:
+            logger.exception("Error uploading video to storage")
+            return None
+    
+    def copy_video(self, storage_url: str, problem_title: str, language: str, video_type: str) -> Optional[str]:
+        """
+        Copy an uploaded video to a new object for another problem/language/video
+        type, server side, so identical renders are not uploaded twice.
+        
+        Args:
+            storage_url: Public URL of the video to copy
+            problem_title: Title of the LeetCode problem the copy is for
+            language: Programming language (python, java, cpp)
+            video_type: Type of video (explanation, brute_force, optimal)
+            
+        Returns:
+            Public URL of the copy, or None if the source is gone or the copy failed
+        """
+        try:
+            source = storage_url.split('/')[-1]
+            filename = self._new_key(self._key_prefix(problem_title, language, video_type))
+            
+            # Try S3 copy first if S3 client is available; content type and
+            # cache headers are copied along with the object
+            if self.s3_client:
+                try:
+                    self.s3_client.copy_object(
+                        Bucket=self.BUCKET_NAME,
+                        Key=filename,
+                        CopySource={"Bucket": self.BUCKET_NAME, "Key": source}
+                    )
+                    return self._public_prefix + filename
+                except Exception:
+                    # S3 copy failed, falling back to Supabase client
+                    pass
+            
+            # storage3 raises StorageException on a non-2xx response
+            self.client.storage.from_(self.BUCKET_NAME).copy(source, filename)
+            return self.client.storage.from_(self.BUCKET_NAME).get_public_url(filename)
             
         except Exception as e:
-            print(f"❌ Error uploading video to storage: {e}")
+            logger.warning("Could not copy video %s in storage: %s", storage_url, e)
             return None
     
+    @staticmethod
+    def _key_prefix(problem_title: str, language: str, video_type: str) -> str:
+        """"<slug>_<language>_<video_type>_" prefix shared by every upload of a video"""
+        safe_title = problem_title.lower().translate(_SAFE_TITLE_TRANS)
+        return f"{safe_title}_{language}_{video_type}_"
+    
+    @staticmethod
+    def _new_key(key_prefix: str) -> str:
+        # Nanosecond timestamp plus random suffix keeps concurrent uploads unique
+        return f"{key_prefix}{time.time_ns():x}_{secrets.token_hex(3)}.mp4"
+    
+    def _forget_upload(self, filename: str) -> None:
+        """Drop cached signed URLs for an object that is being deleted"""
+        with self._signed_urls_lock:
+            for key in [key for key in self._signed_urls if key[0] == filename]:
+                del self._signed_urls[key]
+    
     def get_video_url(self, problem_title: str, language: str, video_type: str) -> Optional[str]:
         """
         Get the public URL for a video from the database.
@@ -174,8 +277,8 @@ class SupabaseStorageService:
             
             return None
             
-        except Exception as e:
-            print(f"Error getting video URL: {e}")
+        except Exception:
+            logger.exception("Error getting video URL")
             return None
     
     def delete_video(self, storage_url: str) -> bool:
@@ -191,8 +294,7 @@ class SupabaseStorageService:
         try:
             # Extract filename from URL
             filename = storage_url.split('/')[-1]
-            
-            # Deleting video from storage
+            self._forget_upload(filename)
             
             # Try S3 delete first if S3 client is available
             if self.s3_client:
@@ -202,10 +304,10 @@ class SupabaseStorageService:
                     return True
                 except ClientError as e:
                     # S3 delete failed, falling back to Supabase client
-                    pass
+                    logger.warning("S3 delete failed, falling back to the Supabase client: %s", e)
                 except Exception as e:
                     # S3 delete error, falling back to Supabase client
-                    pass
+                    logger.warning("S3 delete error, falling back to the Supabase client: %s", e)
             
             # Fallback to Supabase client
             response = self.client.storage.from_(self.BUCKET_NAME).remove([filename])
@@ -217,8 +319,8 @@ class SupabaseStorageService:
                 # Supabase client delete failed
                 return False
             
-        except Exception as e:
-            print(f"❌ Error deleting video from storage: {e}")
+        except Exception:
+            logger.exception("Error deleting video from storage")
             return False
     
     def get_signed_url(self, filename: str, expires_in: int = 3600) -> Optional[str]:
@@ -232,6 +334,13 @@ class SupabaseStorageService:
         Returns:
             Signed URL that expires after specified time
         """
+        key = (filename, expires_in)
+        now = time.monotonic()
+        with self._signed_urls_lock:
+            cached = self._signed_urls.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+        
         try:
             response = self.client.storage.from_(self.BUCKET_NAME).create_signed_url(
                 filename, 
@@ -239,11 +348,17 @@ class SupabaseStorageService:
             )
             
             if response and 'signedURL' in response:
-                return response['signedURL']
+                signed_url = response['signedURL']
+                # Reuse for the first part of its lifetime so clients never get a stale URL
+                reuse_for = int(expires_in * SIGNED_URL_REUSE_FRACTION)
+                if reuse_for > 0:
+                    with self._signed_urls_lock:
+                        self._signed_urls[key] = (signed_url, now + reuse_for)
+                return signed_url
             return None
             
-        except Exception as e:
-            print(f"Error creating signed URL: {e}")
+        except Exception:
+            logger.exception("Error creating signed URL")
             return None
     
     def list_videos(self) -> list:
@@ -257,12 +372,13 @@ class SupabaseStorageService:
             response = self.client.storage.from_(self.BUCKET_NAME).list()
             return response if response else []
             
-        except Exception as e:
-            print(f"Error listing videos: {e}")
+        except Exception:
+            logger.exception("Error listing videos")
             return []
 
 # Global storage service instance
 storage_service = SupabaseStorageService()
 
 if __name__ == "__main__":
-    print(f"Storage service ready - bucket: {storage_service.BUCKET_NAME}")
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Storage service ready - bucket: %s", storage_service.BUCKET_NAME)
\ No newline at end of file
@@ -1,21 +1,109 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse, ORJSONResponse, Response
 from pydantic import BaseModel
-from typing import Literal, Dict, Any, Optional
+from typing import Literal, Dict, Any, Optional, Tuple, get_args
 import uvicorn
 import os
-import requests
-import json
+import orjson
 import httpx
 import asyncio
+import anyio
+import logging
+import queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener
+import threading
+import time
+import heapq
+import hashlib
+import string
+from collections import Counter
+from functools import lru_cache, cached_property
+from contextlib import asynccontextmanager
+from types import MappingProxyType
 from concurrent.futures import ThreadPoolExecutor
-from database.service import DatabaseService
+from cachetools import TTLCache, LRUCache
+from database.service import DatabaseService, AsyncDatabaseService
+from database.client import db_client
 from database.storage import storage_service
 from solution_generator.generator import SolutionGenerator
 from manim_generator.service import ManimVideoService
 
-app = FastAPI(title="LeetCode Video Generator API", version="1.0.0")
+# Configure root logging once for the whole application. Records are handed
+# to a queue and written to stderr by a listener thread, so request handlers
+# and render workers never block on console I/O.
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_stream_handler)
+_log_queue_handler = QueueHandler(_log_queue)
+# Only merge args into the message here; the listener applies the full format
+_log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[_log_queue_handler])
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logger = logging.getLogger(__name__)
+
+# Worker threads available to asyncio.to_thread / run_in_threadpool for
+# offloaded DB and storage calls (the defaults are ~32 and 40)
+OFFLOAD_THREADS = 100
+
+async def warm_up_services() -> None:
+    """
+    Pay one-time costs (Manim availability check, LeetCode DNS/TLS setup)
+    in the background after startup instead of on the first user request.
+    """
+    async def warm_leetcode_connection():
+        try:
+            await get_http_client().head(LEETCODE_GRAPHQL_PATH)
+        except httpx.HTTPError as e:
+            logger.warning("LeetCode connection warmup failed: %s", e)
+    
+    async def warm_manim():
+        try:
+            await asyncio.to_thread(manim_service.warmup)
+        except RuntimeError as e:
+            logger.warning("Manim warmup failed: %s", e)
+    
+    await asyncio.gather(warm_leetcode_connection(), warm_manim())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Size the offload thread pools, start the generation workers and warm up
+    services on startup; stop the workers and release pooled connections on
+    shutdown.
+    """
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=OFFLOAD_THREADS, thread_name_prefix="offload")
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = OFFLOAD_THREADS
+    global generation_queue
+    generation_queue = asyncio.Queue(maxsize=GENERATION_QUEUE_SIZE)
+    _queued_video_ids.clear()
+    workers = [asyncio.create_task(generation_worker()) for _ in range(GENERATION_WORKERS)]
+    recovery_task = asyncio.create_task(recover_interrupted_jobs())
+    warmup_task = asyncio.create_task(warm_up_services())
+    yield
+    recovery_task.cancel()
+    warmup_task.cancel()
+    for worker in workers:
+        worker.cancel()
+    # Only close the LeetCode client if a request actually created it
+    if get_http_client.cache_info().currsize:
+        await get_http_client().aclose()
+        get_http_client.cache_clear()
+    await asyncio.to_thread(db_client.close)
+
+app = FastAPI(
+    title="LeetCode Video Generator API",
+    version="1.0.0",
+    # orjson encodes large problem payloads (HTML content) much faster than stdlib json
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # Add CORS middleware to allow frontend connections
 app.add_middleware(
@@ -27,14 +115,40 @@ app.add_middleware(
 )
 
 # Data models
+# Spaces and hyphens become underscores in normalized title slugs
+_SLUG_TRANS = str.maketrans(" -", "__")
+
+Language = Literal["python", "java", "cpp"]
+VideoType = Literal["explanation", "brute_force", "optimal"]
+LANGUAGES = get_args(Language)
+VIDEO_TYPES = get_args(VideoType)
+
 class VideoRequest(BaseModel):
     problem_title: str  # Raw title from user
-    @property
+    language: Language
+    video_type: VideoType
+
+    @cached_property
     def title_slug(self) -> str:
+        """problem_title normalized once per request (not part of the API schema)"""
         # Normalize to lowercase, replace spaces and hyphens with underscores
-        return self.problem_title.strip().lower().replace(" ", "_").replace("-", "_")
-    language: Literal["python", "java", "cpp"]
-    video_type: Literal["explanation", "brute_force", "optimal"]
+        return self.problem_title.strip().lower().translate(_SLUG_TRANS)
+
+@lru_cache(maxsize=4096)
+def parse_video_id(video_id: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Split "<title_slug>_<language>_<video_type>" into its parts.
+    Both the slug and the video type ("brute_force") may contain underscores,
+    so the suffixes are matched against the known values. Memoized, since
+    status polling parses the same few ids over and over.
+    """
+    for video_type in VIDEO_TYPES:
+        head, sep, tail = video_id.rpartition("_" + video_type)
+        if sep and not tail:
+            title_slug, sep, language = head.rpartition("_")
+            if sep and title_slug and language in LANGUAGES:
+                return title_slug, language, video_type
+    return None
 
 class VideoResponse(BaseModel):
     video_id: str
@@ -42,8 +156,83 @@ class VideoResponse(BaseModel):
     status: Literal["generating", "ready", "error"]
     error_message: Optional[str] = None
 
-# Global dictionary to track video generation status
-video_generation_status: Dict[str, Dict[str, Any]] = {}
+class StatusStore:
+    """
+    Thread-safe, bounded store for video generation status.
+    Written from executor threads and read from async endpoints; entries
+    expire after ttl seconds so finished generations don't accumulate.
+    """
+    
+    def __init__(self, maxsize: int = 10_000, ttl: int = 3600):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.RLock()
+        # video_id -> {(event loop, asyncio.Event)} woken on every change
+        self._watchers: Dict[str, set] = {}
+    
+    def get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of the status so callers never see a half-applied update"""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            return dict(entry) if entry is not None else None
+    
+    def set(self, video_id: str, status: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[video_id] = status
+            self._notify(video_id)
+    
+    def update(self, video_id: str, **fields: Any) -> None:
+        """Merge fields into an existing entry in place (no-op if it has expired)"""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None:
+                # Readers only ever see copies from get(), so mutating under the
+                # lock is safe and avoids allocating a new dict per progress tick
+                entry.update(fields)
+                self._notify(video_id)
+    
+    def pop(self, video_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.pop(video_id, None)
+            self._notify(video_id)
+            return entry
+    
+    def discard_ready(self, video_id: Optional[str] = None) -> None:
+        """Drop "ready" entries (one id, or all) whose video may no longer exist"""
+        with self._lock:
+            video_ids = [video_id] if video_id is not None else list(self._entries)
+            for vid in video_ids:
+                entry = self._entries.get(vid)
+                if entry is not None and entry.get("status") == "ready":
+                    del self._entries[vid]
+                    self._notify(vid)
+    
+    def watch(self, video_id: str, event: asyncio.Event) -> None:
+        """Set event (on the calling loop) whenever the entry for video_id changes"""
+        watcher = (asyncio.get_running_loop(), event)
+        with self._lock:
+            self._watchers.setdefault(video_id, set()).add(watcher)
+    
+    def unwatch(self, video_id: str, event: asyncio.Event) -> None:
+        with self._lock:
+            watchers = self._watchers.get(video_id)
+            if watchers:
+                watchers.difference_update({w for w in watchers if w[1] is event})
+                if not watchers:
+                    del self._watchers[video_id]
+    
+    def _notify(self, video_id: str) -> None:
+        # Called with the lock held, usually from an executor thread
+        for loop, event in self._watchers.get(video_id, ()):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed; the watcher is gone
+                pass
+
+# Global store tracking video generation status. It lives in process memory,
+# which is why render.yaml pins uvicorn to --workers 1: every status read and
+# the generation queue must see the same state.
+video_generation_status = StatusStore()
 
 # Health check endpoint
 @app.get("/")
@@ -54,8 +243,220 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
-# Thread pool for background video generation
-executor = ThreadPoolExecutor(max_workers=2)
+# Thread pool for background video generation. The threads only drive the
+# Groq call, the upload and the manim subprocess, so the CPU-heavy render
+# already runs outside this process; raise the count on hosts with more cores.
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+GENERATION_QUEUE_SIZE = 20
+executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS)
+
+# Bounded queue of (video_id, problem_details, request) jobs; created in lifespan
+generation_queue: Optional[asyncio.Queue] = None
+# video_ids waiting in generation_queue, oldest first (event loop only)
+_queued_video_ids: Dict[str, None] = {}
+
+def _refresh_queue_positions() -> None:
+    """Record each waiting job's 1-based place in line in its status entry"""
+    for position, queued_id in enumerate(_queued_video_ids, 1):
+        video_generation_status.update(queued_id, queue_position=position)
+
+async def generation_worker() -> None:
+    """Take jobs off generation_queue and render them one at a time on the executor"""
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await generation_queue.get()
+        _queued_video_ids.pop(job[0], None)
+        _refresh_queue_positions()
+        try:
+            await loop.run_in_executor(executor, generate_video_background, *job)
+        except Exception:
+            logger.exception("Generation worker error for %s", job[0])
+        finally:
+            generation_queue.task_done()
+
+# Each queued or running generation leaves a "<video_id>.job" file holding its
+# request next to the rendered videos, so a restart can pick it up again
+# instead of clients seeing "not_found" and resubmitting
+JOB_SENTINEL_SUFFIX = ".job"
+# Jobs interrupted longer ago than this (seconds) are reported as failed
+JOB_RESUME_MAX_AGE = 30 * 60
+
+def _job_sentinel_path(video_id: str) -> str:
+    return os.path.join(manim_service.video_renderer.output_dir, os.path.basename(video_id) + JOB_SENTINEL_SUFFIX)
+
+def _write_job_sentinel(video_id: str, problem_details: Dict[str, Any], request: VideoRequest) -> None:
+    try:
+        with open(_job_sentinel_path(video_id), "wb") as sentinel:
+            sentinel.write(orjson.dumps({"problem_details": problem_details, "request": request.model_dump()}))
+    except OSError as e:
+        logger.warning("Could not record generation job %s: %s", video_id, e)
+
+def _remove_job_sentinel(video_id: str) -> None:
+    try:
+        os.remove(_job_sentinel_path(video_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Could not remove generation job record %s: %s", video_id, e)
+
+def _scan_job_sentinels() -> list:
+    """Return (video_id, age in seconds, job or None if unreadable) for each leftover job"""
+    jobs = []
+    now = time.time()
+    with os.scandir(manim_service.video_renderer.output_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(JOB_SENTINEL_SUFFIX):
+                continue
+            video_id = entry.name[:-len(JOB_SENTINEL_SUFFIX)]
+            try:
+                with open(entry.path, "rb") as sentinel:
+                    job = orjson.loads(sentinel.read())
+                age = now - entry.stat().st_mtime
+            except (OSError, orjson.JSONDecodeError):
+                job, age = None, 0
+            jobs.append((video_id, age, job))
+    return jobs
+
+def _fail_interrupted_job(video_id: str) -> None:
+    video_generation_status.set(video_id, {
+        "status": "error",
+        "progress": 0,
+        "message": "Video generation was interrupted. Please try again."
+    })
+
+def _generation_in_flight(video_id: str) -> bool:
+    """Whether this process already has the video queued or generating"""
+    if video_id in _queued_video_ids:
+        return True
+    status = video_generation_status.get(video_id)
+    return status is not None and status["status"] == "generating"
+
+async def recover_interrupted_jobs() -> None:
+    """Re-queue generations that a previous process had queued or was rendering"""
+    try:
+        for video_id, age, job in await asyncio.to_thread(_scan_job_sentinels):
+            # A client may have resubmitted the video since startup; its job
+            # owns the sentinel now
+            if _generation_in_flight(video_id):
+                continue
+            if job is None or age > JOB_RESUME_MAX_AGE:
+                logger.warning("Dropping interrupted generation job: %s", video_id)
+                _fail_interrupted_job(video_id)
+                await asyncio.to_thread(_remove_job_sentinel, video_id)
+                continue
+            
+            request = VideoRequest(**job["request"])
+            # The previous process may have finished just before stopping
+            existing_video = await AsyncDatabaseService.get_video(request.title_slug, request.language, request.video_type)
+            if existing_video and existing_video.get("storage_url"):
+                await asyncio.to_thread(_remove_job_sentinel, video_id)
+                continue
+            # Checked again after the lookup, which yields to request handlers
+            if _generation_in_flight(video_id):
+                continue
+            
+            video_generation_status.set(video_id, {
+                "status": "generating",
+                "progress": 0,
+                "message": "Queued for video generation..."
+            })
+            try:
+                generation_queue.put_nowait((video_id, job["problem_details"], request))
+            except asyncio.QueueFull:
+                _fail_interrupted_job(video_id)
+                await asyncio.to_thread(_remove_job_sentinel, video_id)
+                continue
+            _queued_video_ids[video_id] = None
+            video_generation_status.update(video_id, queue_position=len(_queued_video_ids))
+            logger.info("Resumed interrupted generation: %s", video_id)
+    except Exception:
+        logger.exception("Failed to recover interrupted generation jobs")
+
+def _copy_rendered_script_video(script_hash: str, title_slug: str, request: VideoRequest) -> Optional[str]:
+    """Copy the upload of an earlier render of the same script, if there is one"""
+    source_url = DatabaseService.get_rendered_script_url(script_hash)
+    if not source_url:
+        return None
+    return storage_service.copy_video(source_url, title_slug, request.language, request.video_type)
+
+def _render_and_upload(video_id: str, script_content: str, title_slug: str,
+                       request: VideoRequest) -> Optional[Tuple[str, str]]:
+    """
+    Render a script and upload the result, for generate_video_background.
+    Returns (local video path, storage URL), or None after recording the
+    failure in the generation status.
+    """
+    try:
+        # Map Manim's render progress onto the 50-70% band
+        video_path = manim_service.render_script(
+            script_content,
+            video_id,
+            progress_callback=lambda fraction: video_generation_status.update(
+                video_id, progress=50 + int(fraction * 20)
+            )
+        )
+        logger.info("Video rendered successfully at: %s", video_path)
+    except Exception as e:
+        logger.error("Video rendering failed for %s: %s", video_id, e)
+        video_generation_status.set(video_id, {
+            "status": "error",
+            "progress": 0,
+            "message": "Sorry, we couldn't create the video animation. Please try again later."
+        })
+        return None
+    
+    # Verify video file was created (a single stat, which also yields the
+    # size); an empty file from an aborted render is not worth uploading
+    try:
+        video_size = os.stat(video_path).st_size
+    except FileNotFoundError:
+        video_size = 0
+    if not video_size:
+        logger.error("Video file missing or empty after generation: %s", video_path)
+        # Drop it from disk and the renderer's index so a retry renders again
+        try:
+            manim_service.remove_video(video_path)
+        except FileNotFoundError:
+            pass
+        video_generation_status.set(video_id, {
+            "status": "error",
+            "progress": 0,
+            "message": "Video generation completed but file not found. Please try again."
+        })
+        return None
+    logger.debug("Rendered video size for %s: %s bytes", video_id, video_size)
+    
+    video_generation_status.update(video_id, progress=70, message="Uploading video to storage...")
+    
+    # Upload video to Supabase Storage
+    storage_url = None
+    try:
+        # Map multipart upload progress onto the 70-90% band
+        storage_url = storage_service.upload_video(
+            video_path,
+            title_slug,  # Use normalized title_slug
+            request.language,
+            request.video_type,
+            progress_callback=lambda fraction: video_generation_status.update(
+                video_id, progress=70 + int(fraction * 20)
+            )
+        )
+        
+        if not storage_url:
+            raise Exception("Upload returned no URL")
+        
+        logger.info("Video uploaded to storage successfully: %s", storage_url)
+            
+    except Exception as e:
+        logger.error("Storage upload failed for %s: %s", video_id, e)
+        video_generation_status.set(video_id, {
+            "status": "error",
+            "progress": 0,
+            "message": "Video was created but couldn't be saved to storage. Please try again."
+        })
+        return None
+    
+    return video_path, storage_url
 
 def generate_video_background(video_id: str, problem_details: Dict[str, Any], 
                             request: VideoRequest) -> None:
@@ -64,16 +465,15 @@ def generate_video_background(video_id: str, problem_details: Dict[str, Any],
         title_slug = request.title_slug
         
         # Update status to generating
-        video_generation_status[video_id] = {
+        video_generation_status.set(video_id, {
             "status": "generating",
             "progress": 0,
             "message": "Starting video generation..."
-        }
-        print(f"Starting video generation for: {video_id}")
+        })
+        logger.info("Starting video generation for: %s", video_id)
         
         # Generate solution code
-        video_generation_status[video_id]["progress"] = 20
-        video_generation_status[video_id]["message"] = "Generating solution code..."
+        video_generation_status.update(video_id, progress=20, message="Generating solution code...")
         
         try:
             solution_code = solution_generator.generate_solution(
@@ -81,126 +481,112 @@ def generate_video_background(video_id: str, problem_details: Dict[str, Any],
                 request.language,
                 request.video_type
             )
-            print(f"Solution code generated successfully for: {video_id}")
+            logger.info("Solution code generated successfully for: %s", video_id)
         except Exception as e:
-            print(f"Solution generation failed for {video_id}: {e}")
-            video_generation_status[video_id] = {
+            logger.error("Solution generation failed for %s: %s", video_id, e)
+            video_generation_status.set(video_id, {
                 "status": "error",
                 "progress": 0,
                 "message": "We couldn't generate a solution for this problem. Please check the problem title and try again."
-            }
-            return
-        
-        # Generate and render video
-        video_generation_status[video_id]["progress"] = 50
-        video_generation_status[video_id]["message"] = "Creating video animation..."
-        
-        try:
-            video_path = manim_service.generate_video(
-                problem_details, 
-                solution_code, 
-                request.language, 
-                request.video_type,
-                video_id
-            )
-            print(f"Video rendered successfully at: {video_path}")
-        except Exception as e:
-            print(f"Video rendering failed for {video_id}: {e}")
-            video_generation_status[video_id] = {
-                "status": "error",
-                "progress": 0,
-                "message": "Sorry, we couldn't create the video animation. Please try again later."
-            }
+            })
             return
         
-        # Verify video file was created
-        if not os.path.exists(video_path):
-            print(f"Video file not found after generation: {video_path}")
-            video_generation_status[video_id] = {
-                "status": "error",
-                "progress": 0,
-                "message": "Video generation completed but file not found. Please try again."
-            }
-            return
+        # Generate the Manim script
+        video_generation_status.update(video_id, progress=50, message="Creating video animation...")
         
-        video_generation_status[video_id]["progress"] = 70
-        video_generation_status[video_id]["message"] = "Uploading video to storage..."
-        
-        # Upload video to Supabase Storage
-        storage_url = None
         try:
-            storage_url = storage_service.upload_video(
-                video_path,
-                title_slug,  # Use normalized title_slug
+            script_content = manim_service.generate_script_only(
+                problem_details,
+                solution_code,
                 request.language,
                 request.video_type
             )
-            
-            if not storage_url:
-                raise Exception("Upload returned no URL")
-            
-            print(f"Video uploaded to storage successfully: {storage_url}")
-                
         except Exception as e:
-            print(f"Storage upload failed for {video_id}: {e}")
-            video_generation_status[video_id] = {
+            logger.error("Script generation failed for %s: %s", video_id, e)
+            video_generation_status.set(video_id, {
                 "status": "error",
                 "progress": 0,
-                "message": "Video was created but couldn't be saved to storage. Please try again."
-            }
+                "message": "Sorry, we couldn't create the video animation. Please try again later."
+            })
             return
         
-        video_generation_status[video_id]["progress"] = 90
-        video_generation_status[video_id]["message"] = "Saving video record to database..."
+        # The same script always renders the same video, so reuse an earlier
+        # render of it (for any problem) instead of running Manim again
+        script_hash = hashlib.blake2b(script_content.encode(), digest_size=16).hexdigest()
+        video_path = None
+        storage_url = _copy_rendered_script_video(script_hash, title_slug, request)
+        if storage_url:
+            logger.info("Reused earlier render of identical script for %s: %s", video_id, storage_url)
+        else:
+            rendered = _render_and_upload(video_id, script_content, title_slug, request)
+            if rendered is None:
+                return
+            video_path, storage_url = rendered
+            DatabaseService.record_rendered_script(script_hash, storage_url)
+        
+        video_generation_status.update(video_id, progress=90, message="Saving video record to database...")
         
         # Store video record in database with storage URL
         try:
-            video_record = DatabaseService.create_video(
+            video_saved = DatabaseService.create_video(
                 title_slug,  # Use normalized title_slug
                 request.language,
                 request.video_type,
                 storage_url
             )
             
-            if video_record:
-                print(f"Video record saved to database successfully: {video_record}")
+            if video_saved:
+                logger.info("Video record saved to database successfully for: %s", video_id)
             else:
-                print(f"Warning: Video record creation returned None for {video_id}")
+                logger.warning("Video record creation failed for %s", video_id)
                 
         except Exception as e:
-            print(f"Database save failed for {video_id}: {e}")
+            logger.error("Database save failed for %s: %s", video_id, e)
             # Video is uploaded to storage but not in database - still usable
-            print("Video uploaded to storage but database record failed - video still accessible")
+            logger.warning("Video uploaded to storage but database record failed - video still accessible")
         
-        video_generation_status[video_id]["progress"] = 95
-        video_generation_status[video_id]["message"] = "Cleaning up temporary files..."
+        video_generation_status.update(video_id, progress=95, message="Cleaning up temporary files...")
         
         # Clean up local file after uploading to storage
         try:
-            if os.path.exists(video_path):
-                os.remove(video_path)
-                print(f"Local video file cleaned up: {video_path}")
+            if video_path:
+                manim_service.remove_video(video_path)
+                logger.info("Local video file cleaned up: %s", video_path)
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            print(f"Cleanup failed for {video_path}: {e}")
+            logger.warning("Cleanup failed for %s: %s", video_path, e)
             # Not critical, continue
         
         # Mark as complete
-        video_generation_status[video_id] = {
+        video_generation_status.set(video_id, {
             "status": "ready",
             "progress": 100,
             "message": "Your video is ready!",
             "storage_url": storage_url
-        }
+        })
         
-        print(f"Video generation completed successfully for: {video_id}")
+        logger.info("Video generation completed successfully for: %s", video_id)
         
-    except Exception as e:
-        print(f"Unexpected error in video generation for {video_id}: {e}")
-        video_generation_status[video_id] = {
+    except Exception:
+        logger.exception("Unexpected error in video generation for %s", video_id)
+        video_generation_status.set(video_id, {
             "status": "error",
             "progress": 0,
             "message": "Something went wrong while creating your video. Our team has been notified."
-        }
+        })
+    finally:
+        # Finished either way, so there is nothing to resume after a restart
+        _remove_job_sentinel(video_id)
+
+# In-flight /api/generate-video handlers keyed by video_id, so concurrent
+# identical requests share one DB check, LeetCode fetch and render submission
+_inflight_generate_requests: Dict[str, asyncio.Task] = {}
+
+def _forget_inflight_request(video_id: str, task: asyncio.Task) -> None:
+    # Only drop the entry if it still belongs to this task
+    if _inflight_generate_requests.get(video_id) is task:
+        del _inflight_generate_requests[video_id]
 
 @app.post("/api/generate-video")
 async def generate_video(request: VideoRequest):
@@ -208,41 +594,84 @@ async def generate_video(request: VideoRequest):
     Generate a video for the given problem, language, and video type.
     Returns immediately with a video_id and status, while video generation happens in background.
     Implements proper video caching by checking database before generation.
+    Identical concurrent requests are coalesced onto a single handler run.
+    """
+    video_id = f"{request.title_slug}_{request.language}_{request.video_type}"
+    
+    # Fast path: already generated, answer without touching the database or LeetCode
+    storage_url = _ready_video_urls.get(video_id)
+    if storage_url:
+        return VideoResponse(video_id=video_id, video_url=storage_url, status="ready")
+    
+    task = _inflight_generate_requests.get(video_id)
+    if task is None:
+        task = asyncio.create_task(_generate_video(request, video_id))
+        _inflight_generate_requests[video_id] = task
+        task.add_done_callback(lambda t: _forget_inflight_request(video_id, t))
+    
+    # Shield so one client disconnecting doesn't cancel the work others await
+    return await asyncio.shield(task)
+
+# storage_url of videos known to be ready, keyed by video_id. Only touched on
+# the event loop; the app runs a single worker process (render.yaml), so
+# evicting here on delete/clear keeps it coherent.
+_ready_video_urls = LRUCache(maxsize=4096)
+
+def _forget_ready_videos(video_id: Optional[str] = None) -> None:
+    """
+    Forget that a video (or every video) is ready, in both the URL cache and
+    the status store, so generate_video doesn't hand out a deleted URL.
+    In-flight generations keep their status.
     """
+    if video_id is None:
+        _ready_video_urls.clear()
+    else:
+        _ready_video_urls.pop(video_id, None)
+    video_generation_status.discard_ready(video_id)
+
+# Maps substrings of an unexpected error to the user-facing response, checked in order
+_GENERATE_ERROR_RULES = (
+    (("not found",), 404, "The requested problem could not be found. Please check the problem title and try again."),
+    (("storage", "upload"), 503, "Our video storage service is temporarily unavailable. Please try again in a few minutes."),
+    (("database",), 503, "Our database is temporarily unavailable. Please try again in a few minutes."),
+)
+
+async def _generate_video(request: VideoRequest, video_id: str) -> VideoResponse:
+    """Cache check, problem lookup and background submission for generate_video"""
     try:
         # Use normalized slug for all DB and ID operations
         title_slug = request.title_slug
-        video_id = f"{title_slug}_{request.language}_{request.video_type}"
         
         # STEP 1: Check if video already exists in database (caching)
-        print(f"Checking database for existing video: {title_slug}, {request.language}, {request.video_type}")
-        existing_video = DatabaseService.get_video(
+        logger.debug("Checking database for existing video: %s, %s, %s", title_slug, request.language, request.video_type)
+        existing_video = await AsyncDatabaseService.get_video(
             title_slug,
             request.language,
             request.video_type
         )
         
         if existing_video:
-            print(f"Found existing video in database: {existing_video}")
+            logger.debug("Found existing video in database: %s", existing_video)
             storage_url = existing_video.get('storage_url')
             if storage_url:
                 # Video exists and has valid storage URL - return immediately
-                print(f"Returning cached video with storage URL: {storage_url}")
+                logger.debug("Returning cached video with storage URL: %s", storage_url)
+                _ready_video_urls[video_id] = storage_url
                 return VideoResponse(
                     video_id=video_id,
                     video_url=storage_url,
                     status="ready"
                 )
             else:
-                # Video record exists but no storage URL - clean up and regenerate
-                print("Video record exists but no storage URL - cleaning up")
-                DatabaseService.delete_video(title_slug, request.language, request.video_type)
+                # Video record exists but no storage URL - regenerate; the upsert
+                # in create_video replaces the stale row
+                logger.warning("Video record exists but no storage URL - regenerating")
 
         # STEP 2: Check if video is currently being generated
-        if video_id in video_generation_status:
-            current_status = video_generation_status[video_id]
+        current_status = video_generation_status.get(video_id)
+        if current_status:
             if current_status["status"] == "generating":
-                print(f"Video is currently being generated: {video_id}")
+                logger.debug("Video is currently being generated: %s", video_id)
                 return VideoResponse(
                     video_id=video_id,
                     video_url=f"/api/video-status/{video_id}",
@@ -250,22 +679,41 @@ async def generate_video(request: VideoRequest):
                 )
             elif current_status["status"] == "ready" and "storage_url" in current_status:
                 # Generation completed but not yet stored in DB
-                print(f"Video generation completed, returning storage URL: {current_status['storage_url']}")
+                logger.debug("Video generation completed, returning storage URL: %s", current_status['storage_url'])
+                _ready_video_urls[video_id] = current_status["storage_url"]
                 return VideoResponse(
                     video_id=video_id,
                     video_url=current_status["storage_url"],
                     status="ready"
                 )
 
-        # STEP 3: Fetch problem details before starting generation
-        print(f"Fetching problem details for: {request.problem_title}")
+        # STEP 3: Fetch problem details before starting generation. Only done
+        # now, so requests for existing videos never reach LeetCode.
+        logger.debug("Fetching problem details for: %s", request.problem_title)
         problem_details = await fetch_problem_details(request.problem_title)
         if not problem_details:
             raise HTTPException(status_code=404, detail="Problem not found")
 
-        # STEP 4: Start background video generation
-        print(f"Starting background video generation for: {video_id}")
-        executor.submit(generate_video_background, video_id, problem_details, request)
+        # STEP 4: Start background video generation. Mark it as generating
+        # before submitting so later requests see it in STEP 2.
+        logger.info("Starting background video generation for: %s", video_id)
+        video_generation_status.set(video_id, {
+            "status": "generating",
+            "progress": 0,
+            "message": "Queued for video generation..."
+        })
+        # Record the job before queueing it, so the worker's cleanup always
+        # comes after the write
+        await asyncio.to_thread(_write_job_sentinel, video_id, problem_details, request)
+        try:
+            generation_queue.put_nowait((video_id, problem_details, request))
+        except asyncio.QueueFull:
+            # Reject rather than buffer unbounded work behind the renderers
+            video_generation_status.pop(video_id)
+            await asyncio.to_thread(_remove_job_sentinel, video_id)
+            raise HTTPException(status_code=503, detail="Server is busy generating other videos. Please try again shortly.")
+        _queued_video_ids[video_id] = None
+        video_generation_status.update(video_id, queue_position=len(_queued_video_ids))
         
         return VideoResponse(
             video_id=video_id,
@@ -278,72 +726,162 @@ async def generate_video(request: VideoRequest):
         raise
     except Exception as e:
         # Log the actual error for debugging
-        print(f"Unexpected error in generate_video: {e}")
+        logger.exception("Unexpected error in generate_video")
         
         # Return user-friendly error message
-        if "not found" in str(e).lower():
-            raise HTTPException(status_code=404, detail="The requested problem could not be found. Please check the problem title and try again.")
-        elif "storage" in str(e).lower() or "upload" in str(e).lower():
-            raise HTTPException(status_code=503, detail="Our video storage service is temporarily unavailable. Please try again in a few minutes.")
-        elif "database" in str(e).lower():
-            raise HTTPException(status_code=503, detail="Our database is temporarily unavailable. Please try again in a few minutes.")
-        else:
-            raise HTTPException(status_code=500, detail="We're experiencing technical difficulties. Please try again later or contact support if the problem persists.")
+        message = str(e).lower()
+        for keywords, status_code, detail in _GENERATE_ERROR_RULES:
+            if any(keyword in message for keyword in keywords):
+                raise HTTPException(status_code=status_code, detail=detail)
+        raise HTTPException(status_code=500, detail="We're experiencing technical difficulties. Please try again later or contact support if the problem persists.")
+
+# Chunk size used when streaming a byte range of a local video
+LOCAL_RANGE_CHUNK_SIZE = 1024 * 1024
+
+def _local_video_response(request: Request, path: str, st: os.stat_result):
+    """
+    Serve a locally rendered video, honouring a single HTTP byte range.
+
+    Full requests go through FileResponse with the pre-computed stat result,
+    so Starlette skips the extra stat() and uvicorn can hand the file to
+    loop.sendfile where the transport supports it.
+    """
+    file_size = st.st_size
+    range_header = request.headers.get("range", "")
+    start_str, dash, end_str = range_header[len("bytes="):].strip().partition("-")
+    # A header that doesn't parse as a single byte range is ignored (RFC 9110
+    # 14.2), as are multi-range requests; both get the full file
+    well_formed = (
+        range_header.startswith("bytes=") and dash
+        and (start_str.isdigit() or not start_str) and (end_str.isdigit() or not end_str)
+        and (start_str or end_str)
+        and not (start_str and end_str and int(end_str) < int(start_str))
+    )
+    if not well_formed:
+        response = FileResponse(path, stat_result=st, media_type="video/mp4")
+        response.headers["accept-ranges"] = "bytes"
+        return response
+
+    if start_str:
+        start = int(start_str)
+        end = min(int(end_str) if end_str else file_size - 1, file_size - 1)
+    else:
+        # Suffix range: last N bytes
+        start = max(file_size - int(end_str), 0)
+        end = file_size - 1 if int(end_str) else -1
+    if start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"content-range": f"bytes */{file_size}"},
+        )
+
+    async def iter_range():
+        # Open and read in worker threads; pread needs no shared file position
+        fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+        try:
+            offset = start
+            while offset <= end:
+                chunk = await asyncio.to_thread(os.pread, fd, min(LOCAL_RANGE_CHUNK_SIZE, end - offset + 1), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+        finally:
+            os.close(fd)
+
+    return StreamingResponse(
+        iter_range(),
+        status_code=206,
+        media_type="video/mp4",
+        headers={
+            "accept-ranges": "bytes",
+            "content-range": f"bytes {start}-{end}/{file_size}",
+            "content-length": str(end - start + 1),
+        },
+    )
+
+# Lifetime of signed URLs for private-bucket videos
+SIGNED_URL_EXPIRES_IN = 3600
+# Let a browser briefly reuse a video redirect (e.g. replays) without re-hitting
+# the API. Kept private and short: a video id points at a new object after a
+# delete or regeneration, so shared caches must not pin the old target.
+REDIRECT_MAX_AGE = 60
+PUBLIC_REDIRECT_HEADERS = {"cache-control": f"private, max-age={REDIRECT_MAX_AGE}"}
+SIGNED_REDIRECT_HEADERS = {"cache-control": f"private, max-age={min(REDIRECT_MAX_AGE, SIGNED_URL_EXPIRES_IN // 2 - 60)}"}
+
+async def _find_video_record(video_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a video_id and fetch its database record, shared by get_video and
+    get_video_status. Hits are memoized by DatabaseService, so clients polling
+    both endpoints don't double the database load.
+    
+    Raises:
+        ValueError: If video_id is not "<title_slug>_<language>_<video_type>"
+    """
+    parsed = parse_video_id(video_id)
+    if not parsed:
+        raise ValueError(f"Invalid video ID: {video_id}")
+    title_slug, language, video_type = parsed
+    
+    logger.debug("Looking up video record: title_slug=%s, language=%s, video_type=%s", title_slug, language, video_type)
+    video_record = await AsyncDatabaseService.get_video(title_slug, language, video_type)
+    if video_record:
+        logger.debug("Found video record in database: %s", video_record)
+    return video_record
 
 @app.get("/api/video/{video_id}")
-async def get_video(video_id: str):
+async def get_video(video_id: str, request: Request):
     """
     Serve the generated video file for playback.
     Returns redirect to Supabase storage URL with proper caching logic.
     """
-    from fastapi.responses import RedirectResponse
-    
     try:
-        # Parse video_id to get problem details
-        parts = video_id.split("_")
-        if len(parts) < 3:
-            raise HTTPException(status_code=400, detail="Invalid video ID format")
-        
-        # Extract problem title, language, and video type from video_id
-        # Format: "problem_title_language_videotype"
-        video_type = parts[-1]
-        language = parts[-2]
-        title_slug = "_".join(parts[:-2])  # Keep as slug format
-        
-        print(f"Looking for video: title_slug={title_slug}, language={language}, video_type={video_type}")
-        
         # Get video record from database (primary source)
-        video_record = DatabaseService.get_video(title_slug, language, video_type)
+        try:
+            video_record = await _find_video_record(video_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid video ID format")
         
         if video_record and video_record.get('storage_url'):
             storage_url = video_record['storage_url']
-            print(f"Found video in database with storage URL: {storage_url}")
+            logger.debug("Found video in database with storage URL: %s", storage_url)
             
             # Check if it's a full URL (public bucket) or just filename (private bucket)
             if storage_url.startswith('http'):
                 # Public bucket - redirect directly
-                return RedirectResponse(url=storage_url)
+                return RedirectResponse(url=storage_url, status_code=302, headers=PUBLIC_REDIRECT_HEADERS)
             else:
                 # Private bucket - generate signed URL
                 try:
-                    signed_url = storage_service.get_signed_url(storage_url, expires_in=3600)
+                    signed_url = await asyncio.to_thread(storage_service.get_signed_url, storage_url, expires_in=SIGNED_URL_EXPIRES_IN)
                     if signed_url:
-                        return RedirectResponse(url=signed_url)
+                        return RedirectResponse(url=signed_url, status_code=302, headers=SIGNED_REDIRECT_HEADERS)
                     else:
-                        print(f"Failed to generate signed URL for: {storage_url}")
+                        logger.error("Failed to generate signed URL for: %s", storage_url)
                         raise HTTPException(status_code=500, detail="Failed to generate video access URL")
                 except Exception as e:
-                    print(f"Error generating signed URL: {e}")
+                    logger.error("Error generating signed URL: %s", e)
                     raise HTTPException(status_code=500, detail="Failed to generate video access URL")
         
+        # Fall back to a locally rendered file (e.g. the storage upload failed)
+        local_path = os.path.join(manim_service.video_renderer.output_dir, f"{os.path.basename(video_id)}.mp4")
+        try:
+            local_stat = await asyncio.to_thread(os.stat, local_path)
+        except FileNotFoundError:
+            local_stat = None
+        if local_stat is not None and local_stat.st_size:
+            logger.info("Serving local video file: %s", local_path)
+            return _local_video_response(request, local_path, local_stat)
+        
         # Check if video is currently being generated
-        if video_id in video_generation_status:
-            status_info = video_generation_status[video_id]
+        status_info = video_generation_status.get(video_id)
+        if status_info:
             if status_info["status"] == "ready" and "storage_url" in status_info:
                 # Video generation completed but may not be in database yet
                 storage_url = status_info["storage_url"]
-                print(f"Found video in generation status with storage URL: {storage_url}")
-                return RedirectResponse(url=storage_url)
+                logger.debug("Found video in generation status with storage URL: %s", storage_url)
+                return RedirectResponse(url=storage_url, status_code=302, headers=PUBLIC_REDIRECT_HEADERS)
             elif status_info["status"] == "generating":
                 raise HTTPException(
                     status_code=202, 
@@ -364,64 +902,92 @@ async def get_video(video_id: str):
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
-    except Exception as e:
-        print(f"Unexpected error in get_video: {e}")
+    except Exception:
+        logger.exception("Unexpected error in get_video")
         raise HTTPException(status_code=500, detail="Error retrieving video")
 
+def _status_payload(video_id: str, status_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a generation status entry for API responses"""
+    response = {
+        "video_id": video_id,
+        "status": status_info["status"],
+        "progress": status_info["progress"],
+        "message": status_info["message"]
+    }
+    
+    # Include storage URL if video is ready
+    if status_info["status"] == "ready" and "storage_url" in status_info:
+        response["video_url"] = status_info["storage_url"]
+    
+    # Place in line while waiting for a render worker
+    if "queue_position" in status_info:
+        response["queue_position"] = status_info["queue_position"]
+    
+    return response
+
+# Upper bound on how long a long-poll status request may be held open
+STATUS_LONG_POLL_MAX_WAIT = 25
+
+async def _wait_for_status_change(video_id: str, seen: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+    """Wait up to timeout seconds for the status of video_id to differ from seen"""
+    changed = asyncio.Event()
+    video_generation_status.watch(video_id, changed)
+    try:
+        # Re-read after registering so a change made in between is not missed
+        status_info = video_generation_status.get(video_id)
+        if status_info != seen:
+            return status_info
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return video_generation_status.get(video_id)
+    finally:
+        video_generation_status.unwatch(video_id, changed)
+
 @app.get("/api/video-status/{video_id}")
-async def get_video_status(video_id: str):
+async def get_video_status(video_id: str, wait: float = 0):
     """
     Get the current status of video generation with proper caching logic.
     Returns progress information for ongoing generations or cached video status.
+    With wait > 0 an in-progress generation is long-polled: the response is
+    held until the status changes or wait seconds (capped) have passed.
     """
     try:
         # Check if video is currently being generated
-        if video_id in video_generation_status:
-            status_info = video_generation_status[video_id]
+        status_info = video_generation_status.get(video_id)
+        if status_info and wait > 0 and status_info["status"] not in ("ready", "error"):
+            status_info = await _wait_for_status_change(
+                video_id, status_info, min(wait, STATUS_LONG_POLL_MAX_WAIT)
+            )
+        if status_info:
+            return _status_payload(video_id, status_info)
+        
+        # Check database for existing video; malformed IDs are simply not found
+        try:
+            existing_video = await _find_video_record(video_id)
+        except ValueError:
+            existing_video = None
+        if existing_video:
             response = {
                 "video_id": video_id,
-                "status": status_info["status"],
-                "progress": status_info["progress"],
-                "message": status_info["message"]
+                "status": "ready",
+                "progress": 100,
+                "message": "Video is ready for playback (cached)"
             }
             
-            # Include storage URL if video is ready
-            if status_info["status"] == "ready" and "storage_url" in status_info:
-                response["video_url"] = status_info["storage_url"]
+            # Include storage URL if available
+            storage_url = existing_video.get('storage_url')
+            if storage_url:
+                response["video_url"] = storage_url
+            else:
+                # Video record exists but no storage URL - mark as error
+                response["status"] = "error"
+                response["progress"] = 0
+                response["message"] = "Video record found but storage URL missing"
             
             return response
         
-        # Parse video_id to check database for existing video
-        parts = video_id.split("_")
-        if len(parts) >= 3:
-            video_type = parts[-1]
-            language = parts[-2]
-            title_slug = "_".join(parts[:-2])  # Keep as slug format
-            
-            print(f"Checking database for video status: {title_slug}, {language}, {video_type}")
-            
-            existing_video = DatabaseService.get_video(title_slug, language, video_type)
-            if existing_video:
-                print(f"Found existing video in database: {existing_video}")
-                response = {
-                    "video_id": video_id,
-                    "status": "ready",
-                    "progress": 100,
-                    "message": "Video is ready for playback (cached)"
-                }
-                
-                # Include storage URL if available
-                storage_url = existing_video.get('storage_url')
-                if storage_url:
-                    response["video_url"] = storage_url
-                else:
-                    # Video record exists but no storage URL - mark as error
-                    response["status"] = "error"
-                    response["progress"] = 0
-                    response["message"] = "Video record found but storage URL missing"
-                
-                return response
-        
         # Video not found in generation status or database
         return {
             "video_id": video_id,
@@ -431,7 +997,7 @@ async def get_video_status(video_id: str):
         }
         
     except Exception as e:
-        print(f"Error in get_video_status for {video_id}: {e}")
+        logger.error("Error in get_video_status for %s: %s", video_id, e)
         return {
             "video_id": video_id,
             "status": "error",
@@ -440,126 +1006,316 @@ async def get_video_status(video_id: str):
         }
 
 
+# Seconds between SSE keep-alive comments while a generation is idle
+STATUS_STREAM_KEEPALIVE = 15
 
-# LeetCode API configuration
-LEETCODE_URL = "https://leetcode.com/graphql"
-client = httpx.AsyncClient()
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
 
-async def fetch_problem_details_by_title_slug(title_slug: str) -> Dict[str, Any]:
+@app.get("/api/video-status/{video_id}/stream")
+async def stream_video_status(video_id: str):
     """
-    Fetch problem details directly from LeetCode based on the title slug.
+    Push generation status as Server-Sent Events instead of being polled.
+    Emits an event for each progress change and closes once the video is
+    ready or failed. Videos not currently generating get a single event
+    with the same payload as /api/video-status.
     """
-    query = """
-    query questionData($titleSlug: String!) {
-        question(titleSlug: $titleSlug) {
-            questionId
-            questionFrontendId
-            title
-            content
-            likes
-            dislikes
-            difficulty
-            isPaidOnly
-            solution { canSeeDetail content }
-            hasSolution
-            hasVideoSolution
-        }
+    if video_generation_status.get(video_id) is None:
+        payload = await get_video_status(video_id)
+        return StreamingResponse(iter([_sse_event(payload)]), media_type="text/event-stream")
+    
+    async def events():
+        changed = asyncio.Event()
+        video_generation_status.watch(video_id, changed)
+        try:
+            while True:
+                # Clear before reading so a change made right after is not missed
+                changed.clear()
+                status_info = video_generation_status.get(video_id)
+                if status_info is None:
+                    break
+                yield _sse_event(_status_payload(video_id, status_info))
+                if status_info["status"] in ("ready", "error"):
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=STATUS_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+        finally:
+            video_generation_status.unwatch(video_id, changed)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"}
+    )
+
+# LeetCode API configuration
+LEETCODE_BASE_URL = "https://leetcode.com"
+LEETCODE_GRAPHQL_PATH = "/graphql"
+LEETCODE_QUESTION_QUERY = """
+query questionData($titleSlug: String!) {
+    question(titleSlug: $titleSlug) {
+        questionId
+        questionFrontendId
+        title
+        content
+        likes
+        dislikes
+        difficulty
+        isPaidOnly
+        solution { canSeeDetail content }
+        hasSolution
+        hasVideoSolution
     }
+}
+"""
+_JSON_HEADERS = {"content-type": "application/json"}
+# The query never changes, so encode it once; per call only the slug is encoded
+_QUESTION_PAYLOAD_PREFIX = orjson.dumps({"query": LEETCODE_QUESTION_QUERY})[:-1] + b',"variables":{"titleSlug":'
+_QUESTION_PAYLOAD_SUFFIX = b"}}"
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.AsyncClient:
+    """Shared HTTP/2 client, created on first use so importing main opens no pool"""
+    return httpx.AsyncClient(
+        base_url=LEETCODE_BASE_URL,
+        timeout=httpx.Timeout(10.0, connect=3.0),
+        # Pool settings live on the transport, which also retries failed connects
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+            retries=3
+        )
+    )
+
+# Outbound LeetCode budget: at most 20 requests per minute (bursts allowed up
+# to that), and after 5 consecutive failures stop calling for 30 seconds.
+# A request waits at most 5 seconds for a token before giving up with 503.
+LEETCODE_RATE_LIMIT = 20
+LEETCODE_RATE_PERIOD = 60
+LEETCODE_MAX_TOKEN_WAIT = 5
+LEETCODE_BREAKER_FAILURES = 5
+LEETCODE_BREAKER_RESET = 30
+
+class LeetCodeGuard:
+    """
+    Token bucket plus circuit breaker in front of the LeetCode API.
+    Only used from the event loop, so no locking is needed; state is per
+    process, which is all of it under --workers 1.
     """
     
-    query_payload = {
-        "query": query,
-        "variables": {"titleSlug": title_slug}
-    }
+    def __init__(self, rate: int, period: float, fail_max: int, reset_timeout: float,
+                 max_wait: float = LEETCODE_MAX_TOKEN_WAIT):
+        self._capacity = rate
+        self._tokens = float(rate)
+        self._refill_per_second = rate / period
+        self._refilled_at = time.monotonic()
+        self._max_wait = max_wait
+        self._fail_max = fail_max
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        # Start of the single half-open trial call, while it is outstanding
+        self._probe_started_at: Optional[float] = None
+    
+    def _check_breaker(self, now: float) -> bool:
+        """
+        Raise 503 while the breaker is open. Returns True if this call would
+        be the half-open trial: past the reset timeout exactly one caller is
+        let through, and the rest keep failing fast until it reports back (or
+        is presumed lost after another reset timeout).
+        """
+        if self._opened_at is None:
+            return False
+        if now - self._opened_at < self._reset_timeout or (
+            self._probe_started_at is not None and now - self._probe_started_at < self._reset_timeout
+        ):
+            raise HTTPException(status_code=503, detail="LeetCode is temporarily unavailable")
+        return True
+    
+    async def acquire(self) -> None:
+        """
+        Wait (briefly) for a request token.
+        
+        Raises:
+            HTTPException: 503 while the breaker is open, or if no token frees
+            up within the maximum wait
+        """
+        deadline = time.monotonic() + self._max_wait
+        while True:
+            now = time.monotonic()
+            probe = self._check_breaker(now)
+            self._tokens = min(self._capacity, self._tokens + (now - self._refilled_at) * self._refill_per_second)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                if probe:
+                    self._probe_started_at = now
+                return
+            wait = (1 - self._tokens) / self._refill_per_second
+            if now + wait > deadline:
+                raise HTTPException(status_code=503, detail="Too many LeetCode requests, please try again shortly")
+            await asyncio.sleep(wait)
+    
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+    
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_started_at = None
+        if self._failures >= self._fail_max:
+            if self._opened_at is None or time.monotonic() - self._opened_at >= self._reset_timeout:
+                logger.warning("LeetCode circuit opened after %d consecutive failures", self._failures)
+            self._opened_at = time.monotonic()
+
+leetcode_guard = LeetCodeGuard(
+    LEETCODE_RATE_LIMIT, LEETCODE_RATE_PERIOD, LEETCODE_BREAKER_FAILURES, LEETCODE_BREAKER_RESET
+)
+
+async def fetch_problem_details_by_title_slug(title_slug: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch problem details directly from LeetCode based on the title slug.
+    Calls are rate limited and fail fast while LeetCode keeps failing.
+    Returns None when LeetCode answers that no such question exists.
+    """
+    payload = _QUESTION_PAYLOAD_PREFIX + orjson.dumps(title_slug) + _QUESTION_PAYLOAD_SUFFIX
+    await leetcode_guard.acquire()
     
     try:
-        response = await client.post(LEETCODE_URL, json=query_payload)
+        try:
+            response = await get_http_client().post(LEETCODE_GRAPHQL_PATH, content=payload, headers=_JSON_HEADERS)
+        except httpx.HTTPError:
+            leetcode_guard.record_failure()
+            raise
+        # Throttling and server errors count against the breaker; other
+        # statuses mean LeetCode is up and answering
+        if response.status_code == 429 or response.status_code >= 500:
+            leetcode_guard.record_failure()
+        else:
+            leetcode_guard.record_success()
         if response.status_code == 200:
-            data = response.json()
-            if "data" in data and data["data"].get("question"):
-                return data["data"]["question"]
-            else:
-                raise HTTPException(status_code=404, detail="Problem data not found")
+            data = orjson.loads(response.content)
+            if "data" in data and data["data"]:
+                return data["data"].get("question") or None
+            raise HTTPException(status_code=502, detail="Unexpected response from LeetCode")
         else:
             raise HTTPException(status_code=response.status_code, detail="Error fetching data from LeetCode")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
 
+# Translation table for LeetCode slugs: spaces and underscores become hyphens,
+# other punctuation is dropped and ASCII capitals are lowercased, all in the
+# same pass
+_TRANS = str.maketrans(
+    {**{c: None for c in string.punctuation if c not in "-_"}, " ": "-", "_": "-",
+     **{c: c.lower() for c in string.ascii_uppercase}}
+)
+
+# Fallback problems used when LeetCode is unreachable, keyed by normalized title
+_MOCK_PROBLEMS = MappingProxyType({
+    "two sum": MappingProxyType({
+        "title": "Two Sum",
+        "difficulty": "Easy",
+        "content": "Given an array of integers nums and an integer target, return indices of the two numbers such that they add up to target."
+    }),
+    "add two numbers": MappingProxyType({
+        "title": "Add Two Numbers", 
+        "difficulty": "Medium",
+        "content": "You are given two non-empty linked lists representing two non-negative integers."
+    })
+})
+
+@lru_cache(maxsize=4096)
 def convert_title_to_slug(title: str) -> str:
     """
-    Convert a problem title to a LeetCode slug format.
-    Example: "Two Sum" -> "two-sum"
+    Convert a problem title to a LeetCode slug format in one translate pass:
+    lowercase, punctuation dropped, spaces and underscores turned into hyphens.
+    Example: "Two Sum" -> "two-sum", "two_sum" -> "two-sum", "Pow(x, n)" -> "powx-n"
     """
-    return title.lower().replace(" ", "-")
+    slug = title.translate(_TRANS).strip("-")
+    if "--" in slug:
+        # "Two Sum II - Input Array Is Sorted" -> "two-sum-ii-input-array-is-sorted"
+        slug = "-".join(part for part in slug.split("-") if part)
+    return slug
+
+# Resolved problem details keyed by normalized title. Problem statements are
+# effectively immutable, so entries live for hours. Mock fallbacks are not
+# cached so LeetCode is retried on the next request.
+_problem_details_cache = TTLCache(maxsize=2048, ttl=6 * 3600)
+# Titles that resolved to nothing, remembered briefly to absorb 404 storms
+_missing_problems = TTLCache(maxsize=1024, ttl=60)
 
 async def fetch_problem_details(problem_title: str) -> Optional[Dict[str, Any]]:
     """
     Fetch problem details from database first, then from LeetCode API if not found.
     Stores fetched problems in the database for future use.
     """
-    # First check database for existing problem by title
-    existing_problem = DatabaseService.get_problem_by_title(problem_title)
+    # Serve recently resolved problems from process memory. Hand out a copy
+    # since callers add fields (e.g. "url") to the result.
+    cache_key = problem_title.strip().lower()
+    cached = _problem_details_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+    if cache_key in _missing_problems:
+        return None
+    
+    # Convert title to slug format for LeetCode API
+    title_slug = convert_title_to_slug(problem_title)
+    
+    # Check the database first (one query matching slug or exact title, then
+    # a substring search only on a miss). LeetCode is only asked on a miss, so
+    # its rate limit and circuit breaker only see requests whose answer we use.
+    existing_problem = await AsyncDatabaseService.get_problem_by_title(problem_title, title_slug)
     if existing_problem:
-        return {
+        problem_details = {
             "title": existing_problem["title"],
             "difficulty": existing_problem["difficulty"],
             "content": existing_problem["content"]
         }
+        _problem_details_cache[cache_key] = problem_details
+        return dict(problem_details)
     
-    # If not found in database, try to fetch from LeetCode API
+    # If not found in database, fetch from the LeetCode API
     try:
-        # Convert title to slug format for LeetCode API
-        title_slug = convert_title_to_slug(problem_title)
-        
-        # Check if we have the problem by slug in the database
-        existing_problem_by_slug = DatabaseService.get_problem_by_title_slug(title_slug)
-        if existing_problem_by_slug:
-            return {
-                "title": existing_problem_by_slug["title"],
-                "difficulty": existing_problem_by_slug["difficulty"],
-                "content": existing_problem_by_slug["content"]
-            }
-        
-        # Fetch from LeetCode API
         leetcode_data = await fetch_problem_details_by_title_slug(title_slug)
         
         # Store in database for future use
         if leetcode_data:
-            DatabaseService.create_problem_from_leetcode(leetcode_data, title_slug)
+            await AsyncDatabaseService.create_problem_from_leetcode(leetcode_data, title_slug)
             
-            return {
+            problem_details = {
                 "title": leetcode_data["title"],
                 "difficulty": leetcode_data["difficulty"],
                 "content": leetcode_data["content"]
             }
+            _problem_details_cache[cache_key] = problem_details
+            return dict(problem_details)
         
+        # Only a definite "no such question" is remembered; transient
+        # failures below are retried on the next request
+        _missing_problems[cache_key] = True
         return None
     except Exception as e:
-        print(f"Error fetching problem from LeetCode: {e}")
+        logger.error("Error fetching problem from LeetCode: %s", e)
         
         # Fallback to mock problems if LeetCode API fails
-        mock_problems = {
-            "two sum": {
-                "title": "Two Sum",
-                "difficulty": "Easy",
-                "content": "Given an array of integers nums and an integer target, return indices of the two numbers such that they add up to target."
-            },
-            "add two numbers": {
-                "title": "Add Two Numbers", 
-                "difficulty": "Medium",
-                "content": "You are given two non-empty linked lists representing two non-negative integers."
-            }
-        }
-        
-        # Normalize the problem title for lookup
-        normalized_title = problem_title.lower().strip()
-        return mock_problems.get(normalized_title)
+        mock_problem = _MOCK_PROBLEMS.get(cache_key)
+        if mock_problem is None:
+            return None
+        # Hand out a copy since callers add fields (e.g. "url") to the result
+        return dict(mock_problem)
+
+# Problem statements effectively never change, so let browsers/CDNs keep them
+PROBLEM_CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800"
 
 @app.get("/api/problem/{title}", tags=["Problems"])
-async def get_problem_by_title(title: str):
+async def get_problem_by_title(title: str, request: Request):
     """
     Get details of a problem by its title.
     First checks the database, then fetches from LeetCode if not found.
+    Responses are cacheable and support conditional GET via ETag.
     """
     problem_details = await fetch_problem_details(title)
     if not problem_details:
@@ -569,7 +1325,14 @@ async def get_problem_by_title(title: str):
     title_slug = convert_title_to_slug(title)
     problem_details["url"] = f"https://leetcode.com/problems/{title_slug}/"
     
-    return problem_details
+    body = orjson.dumps(problem_details)
+    headers = {
+        "cache-control": PROBLEM_CACHE_CONTROL,
+        "etag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    }
+    if headers["etag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.delete("/api/video/{video_id}")
 async def delete_video(video_id: str):
@@ -578,16 +1341,14 @@ async def delete_video(video_id: str):
     """
     try:
         # Parse video_id to get problem details
-        parts = video_id.replace("_", " ").split(" ")
-        if len(parts) < 3:
+        parsed = parse_video_id(video_id)
+        if not parsed:
             raise HTTPException(status_code=400, detail="Invalid video ID format")
-        
-        video_type = parts[-1]
-        language = parts[-2]
-        problem_title = " ".join(parts[:-2]).title()
+        title_slug, language, video_type = parsed
+        _forget_ready_videos(video_id)
         
         # Get video record to get storage URL
-        video_record = DatabaseService.get_video(problem_title, language, video_type)
+        video_record = await AsyncDatabaseService.get_video(title_slug, language, video_type)
         
         if not video_record:
             raise HTTPException(status_code=404, detail="Video not found")
@@ -595,46 +1356,51 @@ async def delete_video(video_id: str):
         # Delete from Supabase storage if storage URL exists
         storage_url = video_record.get('storage_url')
         if storage_url:
-            storage_service.delete_video(storage_url)
+            await asyncio.to_thread(storage_service.delete_video, storage_url)
         
         # Delete from database
-        success = DatabaseService.delete_video(problem_title, language, video_type)
+        success = await AsyncDatabaseService.delete_video(title_slug, language, video_type)
         
         if success:
             return {"message": "Video deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail="Failed to delete video from database")
             
+    except HTTPException:
+        # Re-raise HTTP exceptions as-is
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Video deletion failed: {str(e)}")
 
-@app.get("/api/videos")
+@app.get("/api/videos", response_class=ORJSONResponse)
 async def list_videos():
     """
     List all videos stored in database with caching information.
     """
     try:
         # Get videos from storage service
-        storage_videos = storage_service.list_videos()
+        storage_videos = await asyncio.to_thread(storage_service.list_videos)
         
         # Get videos from database
-        db_videos = DatabaseService.get_all_videos()
+        db_videos = await AsyncDatabaseService.get_all_videos()
         
-        return {
+        # Rows are plain JSON types from the APIs, so skip jsonable_encoder's
+        # per-field walk and hand them straight to orjson
+        return ORJSONResponse({
             "storage_videos": storage_videos,
             "database_videos": db_videos,
             "total_cached": len(db_videos) if db_videos else 0
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list videos: {str(e)}")
 
-@app.get("/api/cache/stats")
+@app.get("/api/cache/stats", response_class=ORJSONResponse)
 async def get_cache_stats():
     """
     Get statistics about video caching.
     """
     try:
-        db_videos = DatabaseService.get_all_videos()
+        db_videos = await AsyncDatabaseService.get_all_videos()
         
         stats = {
             "total_cached_videos": len(db_videos) if db_videos else 0,
@@ -644,21 +1410,19 @@ async def get_cache_stats():
         }
         
         if db_videos:
-            # Count by language
+            # Count by language and video type in a single pass
+            by_language = Counter()
+            by_type = Counter()
             for video in db_videos:
-                lang = video.get('language', 'unknown')
-                stats["videos_by_language"][lang] = stats["videos_by_language"].get(lang, 0) + 1
+                by_language[video.get('language', 'unknown')] += 1
+                by_type[video.get('video_type', 'unknown')] += 1
+            stats["videos_by_language"] = dict(by_language)
+            stats["videos_by_type"] = dict(by_type)
             
-            # Count by video type
-            for video in db_videos:
-                vtype = video.get('video_type', 'unknown')
-                stats["videos_by_type"][vtype] = stats["videos_by_type"].get(vtype, 0) + 1
-            
-            # Get recent videos (last 10)
-            sorted_videos = sorted(db_videos, key=lambda x: x.get('created_at', ''), reverse=True)
-            stats["recent_videos"] = sorted_videos[:10]
+            # Get recent videos (last 10) without sorting every row
+            stats["recent_videos"] = heapq.nlargest(10, db_videos, key=lambda x: x.get('created_at', ''))
         
-        return stats
+        return ORJSONResponse(stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get cache stats: {str(e)}")
 
@@ -669,7 +1433,8 @@ async def clear_cache():
     WARNING: This will delete all video records from database but not from storage.
     """
     try:
-        success = DatabaseService.clear_all_videos()
+        success = await AsyncDatabaseService.clear_all_videos()
+        _forget_ready_videos()
         if success:
             return {"message": "Video cache cleared successfully"}
         else:
@@ -699,8 +1464,9 @@ def solution():
     pass
 """
         
-        # Generate Manim script
-        script_content = manim_service.generate_script_only(
+        # Generate Manim script (blocking LLM call, so keep it off the event loop)
+        script_content = await asyncio.to_thread(
+            manim_service.generate_script_only,
             problem_details, 
             solution_code, 
             request.language, 
@@ -721,8 +1487,5 @@ def solution():
 solution_generator = SolutionGenerator()
 manim_service = ManimVideoService()
 
-# Create videos directory if it doesn't exist
-os.makedirs("videos", exist_ok=True)
-
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -2,10 +2,48 @@
 Groq Cloud API client for intelligent Manim script generation.
 """
 
+import ast
 import os
+import httpx
+import re
+from functools import lru_cache
 from groq import Groq
 from typing import Dict, Any, Optional
-import json
+
+# Patterns used on every generated script, compiled once at import
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Characters of the cleaned problem description included in the prompt
+PROMPT_CONTENT_CHARS = 800
+
+# Opening fences of code blocks with python or no language specified, in order of preference
+_CODE_FENCES = ('```python\n', '```\n', '```python')
+# Keyword arguments Code() doesn't accept
+_CODE_INVALID_KWARGS = frozenset({'font_size', 'font', 'size', 'font_color', 'text_size'})
+# Regex fallbacks for scripts that don't parse: Code(..., font_size=..., ...)
+_CODE_FONT_SIZE_RE = re.compile(r'Code\(([^)]*?)font_size\s*=\s*[^,)]+,?\s*([^)]*?)\)')
+# Other parameters Code() doesn't accept (font, size, etc.)
+_CODE_INVALID_PARAM_RES = tuple(
+    re.compile(rf'Code\(([^)]*?){param}[^,)]+,?\s*([^)]*?)\)')
+    for param in ('font=', 'size=', 'font_color=', 'text_size=')
+)
+
+class _CodeKwargStripper(ast.NodeTransformer):
+    """Drop keyword arguments Code() doesn't accept from every Code(...) call"""
+    
+    def __init__(self):
+        self.changed = False
+    
+    def visit_Call(self, node: ast.Call) -> ast.Call:
+        self.generic_visit(node)
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else getattr(func, 'attr', None)
+        if name == 'Code':
+            keywords = [kw for kw in node.keywords if kw.arg not in _CODE_INVALID_KWARGS]
+            if len(keywords) != len(node.keywords):
+                node.keywords = keywords
+                self.changed = True
+        return node
 
 class GroqManimScriptClient:
     """Client for generating Manim scripts using Groq Cloud API"""
@@ -15,7 +53,15 @@ class GroqManimScriptClient:
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        self.client = Groq(api_key=self.api_key)
+        # Long-lived HTTP/2 pool, as in GroqSolutionClient
+        self.client = Groq(
+            api_key=self.api_key,
+            http_client=httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=300),
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
+        )
         self.model = "llama3-70b-8192"  # Fast model for script generation
     
     def generate_manim_script(self, problem_data: Dict[str, Any], solution_code: str, 
@@ -61,8 +107,10 @@ class GroqManimScriptClient:
             print(f"Groq API error: {e}")
             raise Exception(f"Failed to generate Manim script using Groq API: {str(e)}")
     
-    def _get_system_prompt(self, video_type: str) -> str:
-        """Get system prompt based on video type"""
+    @staticmethod
+    @lru_cache(maxsize=4)
+    def _get_system_prompt(video_type: str) -> str:
+        """Get system prompt based on video type (built once per type)"""
         base_prompt = """
 You are an expert Manim animator and coding instructor.
 Generate complete, working Manim scripts for LeetCode problem explanations.
@@ -130,7 +178,7 @@ Create an optimal solution video:
         """Build the user prompt with problem and solution details"""
         
         # Clean and truncate content for the prompt
-        problem_content = self._clean_content(problem_data.get('content', ''))
+        problem_content = self._clean_content(problem_data.get('content', ''), max_len=PROMPT_CONTENT_CHARS)
         problem_title = problem_data.get('title', 'Unknown Problem')
         difficulty = problem_data.get('difficulty', 'Unknown')
         
@@ -146,7 +194,7 @@ Language: {language}
 Video Type: {video_type}
 
 Problem Description:
-{problem_content[:800]}
+{problem_content}
 
 Solution Code:
 ```{language}
@@ -206,56 +254,64 @@ The response should be ready to save as a .py file and run directly.
         
         return prompt
     
-    def _clean_content(self, content: str) -> str:
-        """Clean HTML content for prompt"""
-        import re
-        # Remove HTML tags
-        clean = re.sub(r'<[^>]+>', '', content)
-        # Remove extra whitespace
-        clean = re.sub(r'\s+', ' ', clean).strip()
-        return clean
+    def _clean_content(self, content: str, max_len: Optional[int] = None) -> str:
+        """
+        Clean HTML content for prompt.
+        
+        Args:
+            content: Problem description HTML
+            max_len: Keep at most this many characters of the cleaned text
+            
+        Returns:
+            Text with tags removed and whitespace collapsed
+        """
+        if max_len is not None:
+            # Markup seldom makes up more than 3/4 of a description, so try
+            # cleaning just a prefix first. Cutting right after a '>' keeps
+            # every tag in the prefix whole, so the result is an exact prefix
+            # of what cleaning the full content would give.
+            cut = content.rfind('>', 0, max_len * 4) + 1
+            if cut and cut < len(content):
+                clean = self._clean_content(content[:cut])
+                if len(clean) >= max_len:
+                    return clean[:max_len]
+            return self._clean_content(content)[:max_len]
+        # Remove HTML tags, then collapse extra whitespace
+        return _WHITESPACE_RE.sub(' ', _HTML_TAG_RE.sub('', content)).strip()
     
     def _truncate_code(self, code: str, max_lines: int = 30) -> str:
         """Truncate code to reasonable length for prompt"""
-        lines = code.split('\n')
-        if len(lines) <= max_lines:
-            return code
-        
-        truncated_lines = lines[:max_lines]
-        truncated_lines.append("# ... (code truncated for brevity)")
-        return '\n'.join(truncated_lines)
+        # Find the end of the max_lines-th line without splitting the whole string
+        pos = -1
+        for _ in range(max_lines):
+            pos = code.find('\n', pos + 1)
+            if pos == -1:
+                return code
+        return code[:pos] + "\n# ... (code truncated for brevity)"
     
     def _extract_python_code(self, response: str) -> str:
         """Extract Python code from markdown or mixed response"""
-        import re
-        
-        # Look for code blocks with python or no language specified
-        code_block_patterns = [
-            r'```python\n(.*?)```',
-            r'```\n(.*?)```',
-            r'```python(.*?)```'
-        ]
+        # Look for code blocks with python or no language specified; plain
+        # find() calls, since the model almost always returns a fenced block
+        for fence in _CODE_FENCES:
+            start = response.find(fence)
+            if start != -1:
+                start += len(fence)
+                end = response.find('```', start)
+                if end != -1:
+                    return response[start:end].strip()
         
-        for pattern in code_block_patterns:
-            match = re.search(pattern, response, re.DOTALL)
-            if match:
-                return match.group(1).strip()
-        
-        # If no code blocks found, look for lines starting with 'from manim import'
-        lines = response.split('\n')
-        start_idx = -1
-        
-        for i, line in enumerate(lines):
-            if line.strip().startswith('from manim import'):
-                start_idx = i
-                break
-        
-        if start_idx >= 0:
-            # Extract from 'from manim import' to the end
-            code_lines = lines[start_idx:]
-            return '\n'.join(code_lines).strip()
+        # If no code blocks found, look for a line starting with 'from manim import'
+        # and extract from there to the end
+        idx = response.find('from manim import')
+        while idx != -1:
+            line_start = response.rfind('\n', 0, idx) + 1
+            if not response[line_start:idx].strip():
+                return response[line_start:].strip()
+            idx = response.find('from manim import', idx + 1)
         
         # If still no code found, try to find class definition
+        lines = response.split('\n')
         for i, line in enumerate(lines):
             if 'class' in line and 'Scene' in line:
                 # Found a scene class, extract from here
@@ -296,12 +352,20 @@ The response should be ready to save as a .py file and run directly.
     
     def _fix_code_object_parameters(self, script_content: str) -> str:
         """Fix common Code object parameter issues"""
-        import re
+        # Walk the parsed script so calls spanning lines or containing nested
+        # parentheses are handled; only re-emit the source if something changed
+        try:
+            tree = ast.parse(script_content)
+        except SyntaxError:
+            return self._fix_code_object_parameters_with_regex(script_content)
         
+        stripper = _CodeKwargStripper()
+        stripper.visit(tree)
+        return ast.unparse(tree) if stripper.changed else script_content
+    
+    def _fix_code_object_parameters_with_regex(self, script_content: str) -> str:
+        """Best-effort textual fix for scripts that don't parse"""
         # Remove font_size parameter from Code objects
-        # Pattern: Code(..., font_size=..., ...)
-        pattern = r'Code\(([^)]*?)font_size\s*=\s*[^,)]+,?\s*([^)]*?)\)'
-        
         def fix_code_match(match):
             before = match.group(1)
             after = match.group(2)
@@ -316,13 +380,11 @@ The response should be ready to save as a .py file and run directly.
             return f'Code({params})'
         
         # Apply the fix
-        fixed_content = re.sub(pattern, fix_code_match, script_content)
+        fixed_content = _CODE_FONT_SIZE_RE.sub(fix_code_match, script_content)
         
         # Also fix any other invalid Code parameters that might cause issues
         # Remove any other invalid parameters like font, size, etc.
-        invalid_params = ['font=', 'size=', 'font_color=', 'text_size=']
-        for param in invalid_params:
-            pattern = rf'Code\(([^)]*?){param}[^,)]+,?\s*([^)]*?)\)'
-            fixed_content = re.sub(pattern, r'Code(\1\2)', fixed_content)
+        for pattern in _CODE_INVALID_PARAM_RES:
+            fixed_content = pattern.sub(r'Code(\1\2)', fixed_content)
         
         return fixed_content
\ No newline at end of file
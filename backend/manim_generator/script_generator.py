@@ -2,8 +2,7 @@
 Manim script generator that creates animation scripts for different video types using Groq AI.
 """
 
-import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 from .groq_script_client import GroqManimScriptClient
 
 class ManimScriptGenerator:
@@ -2,7 +2,7 @@
 Main service for Manim video generation that integrates script generation and rendering.
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
 from .script_generator import ManimScriptGenerator
 from .video_renderer import ManimVideoRenderer
 
@@ -14,7 +14,8 @@ class ManimVideoService:
         self.video_renderer = ManimVideoRenderer(output_dir)
     
     def generate_video(self, problem_data: Dict[str, Any], solution_code: str, 
-                      language: str, video_type: str, video_id: str) -> str:
+                      language: str, video_type: str, video_id: str,
+                      progress_callback: Optional[Callable[[float], None]] = None) -> str:
         """
         Generate a complete video from problem data and solution.
         
@@ -24,6 +25,7 @@ class ManimVideoService:
             language: Programming language (python, java, cpp)
             video_type: Type of video (explanation, brute_force, optimal)
             video_id: Unique identifier for the video
+            progress_callback: Optional callable receiving render progress (0.0-1.0)
             
         Returns:
             Path to the generated video file
@@ -36,7 +38,7 @@ class ManimVideoService:
             
             # Render video from script
             video_path = self.video_renderer.render_video(
-                script_content, video_id
+                script_content, video_id, progress_callback
             )
             
             return video_path
@@ -44,6 +46,24 @@ class ManimVideoService:
         except Exception as e:
             raise RuntimeError(f"Video generation failed: {str(e)}")
     
+    def render_script(self, script_content: str, video_id: str,
+                      progress_callback: Optional[Callable[[float], None]] = None) -> str:
+        """
+        Render an already generated Manim script.
+        
+        Args:
+            script_content: Manim script from generate_script_only
+            video_id: Unique identifier for the video
+            progress_callback: Optional callable receiving render progress (0.0-1.0)
+            
+        Returns:
+            Path to the generated video file
+        """
+        try:
+            return self.video_renderer.render_video(script_content, video_id, progress_callback)
+        except Exception as e:
+            raise RuntimeError(f"Video generation failed: {str(e)}")
+    
     def generate_script_only(self, problem_data: Dict[str, Any], solution_code: str, 
                            language: str, video_type: str) -> str:
         """
@@ -63,6 +83,19 @@ class ManimVideoService:
             problem_data, solution_code, language, video_type
         )
     
+    def remove_video(self, video_path: str) -> None:
+        """
+        Delete a local video file once it has been uploaded to storage.
+        
+        Args:
+            video_path: Path returned by generate_video
+        """
+        self.video_renderer.remove_video(video_path)
+    
+    def warmup(self) -> None:
+        """Do one-time renderer setup before the first request needs it"""
+        self.video_renderer.warmup()
+    
     def cleanup(self):
         """Clean up temporary files"""
         self.video_renderer.cleanup_temp_files()
\ No newline at end of file
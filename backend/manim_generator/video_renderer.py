@@ -3,25 +3,62 @@ Video renderer that takes Manim scripts and generates video files.
 """
 
 import os
+import re
+import shutil
 import subprocess
 import tempfile
-from typing import Dict, Any, Optional
+import threading
+from collections import deque
+from typing import Optional, Callable
 import uuid
 
+# Maximum time a single Manim render may take, in seconds
+RENDER_TIMEOUT = 300
+
+# Manim's per-animation progress bar, e.g. "Animation 3: Write(Text):  45%|####  | 27/60"
+_ANIMATION_PROGRESS_RE = re.compile(r"Animation (\d+).*?(\d+)%\|")
+# Each play()/wait() call in a scene renders as one animation
+_ANIMATION_CALL_RE = re.compile(r"self\.(?:play|wait)\(")
+# Class that inherits from Scene
+_SCENE_CLASS_RE = re.compile(r'class\s+(\w+)\s*\(\s*Scene\s*\):')
+
 class ManimVideoRenderer:
     """Handles rendering of Manim scripts to video files"""
     
     def __init__(self, output_dir: str = "videos"):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        # In-memory index of rendered files so reuse checks don't stat the disk
+        self._known_videos = {
+            entry.name for entry in os.scandir(output_dir)
+            if entry.is_file() and entry.name.endswith('.mp4')
+        }
+        # Set once `manim --version` has succeeded so renders skip the check
+        self._manim_available = False
+    
+    def warmup(self) -> None:
+        """Run the one-time Manim availability check ahead of the first render"""
+        self._ensure_manim_available()
     
-    def render_video(self, script_content: str, video_id: str) -> str:
+    def _ensure_manim_available(self) -> None:
+        if self._manim_available:
+            return
+        try:
+            subprocess.run(["manim", "--version"], capture_output=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            raise RuntimeError("Manim is not installed or not available in PATH")
+        self._manim_available = True
+    
+    def render_video(self, script_content: str, video_id: str,
+                     progress_callback: Optional[Callable[[float], None]] = None) -> str:
         """
         Render a Manim script to a video file.
         
         Args:
             script_content: The complete Manim script as string
             video_id: Unique identifier for the video
+            progress_callback: Optional callable receiving the estimated render
+                progress (0.0-1.0) as Manim reports it
             
         Returns:
             Path to the generated video file
@@ -45,14 +82,11 @@ class ManimVideoRenderer:
             video_path = os.path.join(self.output_dir, video_filename)
             
             # Check if video already exists
-            if os.path.exists(video_path):
+            if video_filename in self._known_videos:
                 return video_path
             
             # Check if manim is available
-            try:
-                subprocess.run(["manim", "--version"], capture_output=True, check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                raise RuntimeError("Manim is not installed or not available in PATH")
+            self._ensure_manim_available()
             
             # Create temporary media directory for this render
             temp_media_dir = os.path.join(tempfile.gettempdir(), f"manim_media_{uuid.uuid4().hex}")
@@ -72,23 +106,19 @@ class ManimVideoRenderer:
             ]
             
             # Run Manim rendering
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
+            total_animations = max(len(_ANIMATION_CALL_RE.findall(script_content)), 1)
+            returncode, output = self._run_manim(cmd, total_animations, progress_callback)
             
-            if result.returncode != 0:
-                error_msg = result.stderr or result.stdout or "Unknown error"
+            if returncode != 0:
+                error_msg = output or "Unknown error"
                 raise RuntimeError(f"Manim rendering failed: {error_msg}")
             
             # Find the actual output file (Manim creates subdirectories)
             actual_video_path = self._find_rendered_video_in_dir(temp_media_dir, video_filename)
             if actual_video_path and os.path.exists(actual_video_path):
                 # Move to expected location
-                import shutil
                 shutil.move(actual_video_path, video_path)
+                self._known_videos.add(video_filename)
                 
                 # Clean up temporary media directory
                 try:
@@ -121,12 +151,72 @@ class ManimVideoRenderer:
                 except:
                     pass  # Ignore cleanup errors
     
+    def _run_manim(self, cmd: list, total_animations: int,
+                   progress_callback: Optional[Callable[[float], None]]) -> tuple:
+        """
+        Run Manim, streaming its output line by line to report progress.
+        
+        Args:
+            cmd: Manim command line
+            total_animations: Estimated number of animations in the scene
+            progress_callback: Optional callable receiving progress (0.0-1.0)
+            
+        Returns:
+            Tuple of (return code, tail of the combined stdout/stderr)
+        """
+        # Text mode treats the progress bar's carriage returns as line breaks
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        timed_out = threading.Event()
+        
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+        
+        timer = threading.Timer(RENDER_TIMEOUT, kill_on_timeout)
+        timer.start()
+        output_tail = deque(maxlen=200)
+        last_percent = -1
+        try:
+            for line in process.stdout:
+                output_tail.append(line)
+                if progress_callback is None:
+                    continue
+                match = _ANIMATION_PROGRESS_RE.search(line)
+                if match:
+                    done = int(match.group(1)) + int(match.group(2)) / 100
+                    percent = min(int(done * 100 / total_animations), 100)
+                    # Only report whole-percent changes
+                    if percent != last_percent:
+                        last_percent = percent
+                        progress_callback(percent / 100)
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+            process.stdout.close()
+        
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, RENDER_TIMEOUT)
+        return returncode, "".join(output_tail)
+    
+    def remove_video(self, video_path: str) -> None:
+        """
+        Delete a rendered video file and drop it from the in-memory index.
+        
+        Args:
+            video_path: Path returned by render_video
+        """
+        self._known_videos.discard(os.path.basename(video_path))
+        os.remove(video_path)
+    
     def _extract_scene_class(self, script_content: str) -> Optional[str]:
         """Extract the scene class name from the script"""
-        import re
-        
-        # Look for class that inherits from Scene
-        match = re.search(r'class\s+(\w+)\s*\(\s*Scene\s*\):', script_content)
+        match = _SCENE_CLASS_RE.search(script_content)
         if match:
             return match.group(1)
         return None
@@ -181,7 +271,6 @@ class ManimVideoRenderer:
         """Clean up temporary Manim files"""
         media_dir = os.path.join(self.output_dir, "videos")
         if os.path.exists(media_dir):
-            import shutil
             shutil.rmtree(media_dir)
         
         # Clean up any temp script files
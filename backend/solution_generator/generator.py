@@ -2,8 +2,7 @@
 Solution generator that creates code solutions for LeetCode problems using AI.
 """
 
-import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 from .groq_client import GroqSolutionClient
 
 class SolutionGenerator:
@@ -3,6 +3,8 @@ Groq Cloud API client for intelligent solution generation.
 """
 
 import os
+import httpx
+from functools import lru_cache
 from groq import Groq
 from typing import Dict, Any
 
@@ -14,7 +16,16 @@ class GroqSolutionClient:
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        self.client = Groq(api_key=self.api_key)
+        # Keep connections to Groq open between renders (httpx drops idle
+        # ones after 5 s by default), so each job skips the TLS handshake
+        self.client = Groq(
+            api_key=self.api_key,
+            http_client=httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=300),
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
+        )
         self.model = "llama3-70b-8192"  # Fast model for code generation
     
     def generate_solution(self, problem_data: Dict[str, Any], language: str, video_type: str) -> str:
@@ -56,8 +67,10 @@ class GroqSolutionClient:
             # No fallback - raise the error
             raise Exception(f"Failed to generate solution using Groq API: {str(e)}")
     
-    def _get_system_prompt(self, language: str, video_type: str) -> str:
-        """Get system prompt based on language and video type"""
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _get_system_prompt(language: str, video_type: str) -> str:
+        """Get system prompt based on language and video type (built once per pair)"""
         base_prompt = f"""
 You are an expert competitive programmer and coding instructor.
 Generate clean, well-commented {language} code for LeetCode problems.
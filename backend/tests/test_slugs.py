@@ -0,0 +1,32 @@
+import os
+import unittest
+
+# main.py builds its Supabase and Groq clients at import time; placeholder
+# credentials are enough since nothing here talks to either service
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test")
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from main import convert_title_to_slug
+
+
+class ConvertTitleToSlugTest(unittest.TestCase):
+    def test_spaces_become_hyphens(self):
+        self.assertEqual(convert_title_to_slug("Two Sum"), "two-sum")
+
+    def test_underscores_become_hyphens(self):
+        self.assertEqual(convert_title_to_slug("two_sum"), "two-sum")
+        self.assertEqual(convert_title_to_slug("Two_Sum_II"), "two-sum-ii")
+
+    def test_punctuation_is_dropped(self):
+        self.assertEqual(convert_title_to_slug("Pow(x, n)"), "powx-n")
+
+    def test_hyphen_runs_collapse(self):
+        self.assertEqual(
+            convert_title_to_slug("Two Sum II - Input Array Is Sorted"),
+            "two-sum-ii-input-array-is-sorted",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()